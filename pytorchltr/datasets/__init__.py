@@ -4,3 +4,4 @@ from pytorchltr.datasets.svmrank.istella_s import IstellaS  # noqa: F401
 from pytorchltr.datasets.svmrank.istella_x import IstellaX  # noqa: F401
 from pytorchltr.datasets.svmrank.mslr10k import MSLR10K  # noqa: F401
 from pytorchltr.datasets.svmrank.mslr30k import MSLR30K  # noqa: F401
+from pytorchltr.datasets.svmrank.svmrank import load_splits  # noqa: F401
@@ -0,0 +1,242 @@
+import logging
+import math
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+import numpy as _np
+import torch as _torch
+from torch.utils.data import Sampler as _Sampler
+
+
+def _permutation(n: int, shuffle: bool, rng_kw) -> _np.ndarray:
+    """Returns a random permutation of range(n), or range(n) itself if
+    shuffle is False."""
+    if not shuffle:
+        return _np.arange(n)
+    return _torch.randperm(n, **rng_kw).numpy()
+
+
+def padding_ratio(lengths: Sequence[int],
+                  batches: Sequence[Sequence[int]]) -> float:
+    """Returns the fraction of the (batch, list) entries of given batches
+    that is padding when each batch is padded to its longest list.
+
+    Args:
+        lengths: The number of documents of each dataset item.
+        batches: The dataset indices of the items of each batch.
+
+    Returns:
+        The padding ratio, between 0.0 and 1.0.
+    """
+    lengths = _np.asarray(lengths)
+    documents = 0
+    entries = 0
+    for batch in batches:
+        batch_lengths = lengths[_np.asarray(batch, dtype=_np.int64)]
+        if len(batch_lengths) > 0:
+            documents += int(batch_lengths.sum())
+            entries += len(batch_lengths) * int(batch_lengths.max())
+    return 1.0 - documents / entries if entries > 0 else 0.0
+
+
+class BucketBatchSampler(_Sampler):
+    """Batch sampler that groups dataset items with similar numbers of
+    documents, which minimizes the padding of collated batches.
+
+    Each epoch, the items are randomly permuted and split into buckets of
+    `bucket_size` batches. The items of each bucket are sorted by their
+    number of documents and cut into batches, and the batches of all buckets
+    are shuffled. Items with equal lengths are thus still shuffled within a
+    bucket, and items end up in different batches every epoch.
+
+    The padding ratio of the batches of the last epoch is available as
+    :attr:`padding_ratio`.
+
+    Example:
+        >>> sampler = BucketBatchSampler(dataset.get_lengths(), 32)
+        >>> loader = DataLoader(dataset, batch_sampler=sampler,
+        ...                     collate_fn=dataset.collate_fn())
+    """
+    def __init__(self, lengths: Sequence[int], batch_size: int,
+                 bucket_size: int = 100, shuffle: bool = True,
+                 drop_last: bool = False,
+                 generator: Optional[_torch.Generator] = None):
+        """
+        Args:
+            lengths: The number of documents of each dataset item, such as
+                returned by
+                :meth:`pytorchltr.datasets.svmrank.SVMRankDataset.get_lengths`.
+            batch_size: The number of items per batch.
+            bucket_size: The number of batches per bucket. Larger buckets
+                give less padding but less randomness in which items are
+                batched together.
+            shuffle: Whether to shuffle the items and batches. If False, the
+                items are bucketed in order and the batches are returned in
+                order.
+            drop_last: Whether to drop the last batch if it is smaller than
+                batch_size.
+            generator: (Optional) the random number generator to shuffle
+                with.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size should be a positive integer")
+        if bucket_size < 1:
+            raise ValueError("bucket_size should be a positive integer")
+        self.lengths = _np.asarray(lengths, dtype=_np.int64)
+        self.batch_size = batch_size
+        self.bucket_size = bucket_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.rng_kw = {"generator": generator} if generator is not None else {}
+        self.padding_ratio = None
+
+    def batches(self) -> List[List[int]]:
+        """Samples the batches of one epoch.
+
+        Returns:
+            A list with the dataset indices of the items of each batch.
+        """
+        indices = _permutation(len(self.lengths), self.shuffle, self.rng_kw)
+        items_per_bucket = self.batch_size * self.bucket_size
+        batches = []
+        for start in range(0, len(indices), items_per_bucket):
+            bucket = indices[start:start + items_per_bucket]
+            bucket = bucket[_np.argsort(self.lengths[bucket], kind="stable")]
+            for batch_start in range(0, len(bucket), self.batch_size):
+                batch = bucket[batch_start:batch_start + self.batch_size]
+                if len(batch) == self.batch_size or not self.drop_last:
+                    batches.append(batch.tolist())
+        return [batches[i] for i in
+                _permutation(len(batches), self.shuffle, self.rng_kw)]
+
+    def __iter__(self) -> Iterator[List[int]]:
+        batches = self.batches()
+        self.padding_ratio = padding_ratio(self.lengths, batches)
+        logging.debug("bucketed %d batches with a padding ratio of %.3f",
+                      len(batches), self.padding_ratio)
+        return iter(batches)
+
+    def __len__(self) -> int:
+        if self.drop_last:
+            return len(self.lengths) // self.batch_size
+        return math.ceil(len(self.lengths) / self.batch_size)
+
+
+class BudgetBatchSampler(_Sampler):
+    """Batch sampler that packs dataset items into batches until a budget of
+    documents or document pairs per batch is reached, instead of using a
+    fixed number of items per batch.
+
+    Costs are counted as collated, i.e. padded to the longest list of the
+    batch: a batch of b items of which the longest has n documents costs
+    b * n documents and b * n * n document pairs. This keeps the size of the
+    collated tensors, and the cost of pairwise losses, stable from batch to
+    batch. An item that exceeds the budget on its own forms a batch by
+    itself.
+
+    Each epoch, the items are randomly permuted and split into buckets of
+    `bucket_size` items, and the items of each bucket are sorted by length
+    before they are packed, which keeps padding low. The batches of all
+    buckets are shuffled. Since the number of batches depends on the
+    permutation, the batches of the next epoch are sampled by :meth:`__len__`
+    already.
+
+    Example:
+        >>> sampler = BudgetBatchSampler(dataset.get_lengths(),
+        ...                              max_pairs=100000)
+        >>> loader = DataLoader(dataset, batch_sampler=sampler,
+        ...                     collate_fn=dataset.collate_fn())
+    """
+    def __init__(self, lengths: Sequence[int],
+                 max_documents: Optional[int] = None,
+                 max_pairs: Optional[int] = None,
+                 bucket_size: Optional[int] = 4096, shuffle: bool = True,
+                 generator: Optional[_torch.Generator] = None):
+        """
+        Args:
+            lengths: The number of documents of each dataset item, such as
+                returned by
+                :meth:`pytorchltr.datasets.svmrank.SVMRankDataset.get_lengths`.
+            max_documents: (Optional) the maximum number of (padded)
+                documents per batch.
+            max_pairs: (Optional) the maximum number of (padded) document
+                pairs per batch.
+            bucket_size: (Optional) the number of items per bucket whose
+                items are sorted by length before packing. If None, items are
+                packed in random order.
+            shuffle: Whether to shuffle the items and batches. If False, the
+                items are bucketed in order and the batches are returned in
+                order.
+            generator: (Optional) the random number generator to shuffle
+                with.
+        """
+        if max_documents is None and max_pairs is None:
+            raise ValueError("either max_documents or max_pairs is required")
+        if bucket_size is not None and bucket_size < 1:
+            raise ValueError("bucket_size should be a positive integer")
+        self.lengths = _np.asarray(lengths, dtype=_np.int64)
+        self.max_documents = max_documents
+        self.max_pairs = max_pairs
+        self.bucket_size = bucket_size
+        self.shuffle = shuffle
+        self.rng_kw = {"generator": generator} if generator is not None else {}
+        self.padding_ratio = None
+        self._next_batches = None
+
+    def _fits(self, size: int, list_size: int) -> bool:
+        """Returns whether a batch of given size and list size fits in the
+        budget."""
+        if self.max_documents is not None and \
+                size * list_size > self.max_documents:
+            return False
+        if self.max_pairs is not None and \
+                size * list_size * list_size > self.max_pairs:
+            return False
+        return True
+
+    def batches(self) -> List[List[int]]:
+        """Samples the batches of one epoch.
+
+        Returns:
+            A list with the dataset indices of the items of each batch.
+        """
+        indices = _permutation(len(self.lengths), self.shuffle, self.rng_kw)
+        bucket_size = self.bucket_size or max(len(indices), 1)
+        batches = []
+        for start in range(0, len(indices), bucket_size):
+            bucket = indices[start:start + bucket_size]
+            if self.bucket_size is not None:
+                bucket = bucket[_np.argsort(self.lengths[bucket],
+                                            kind="stable")]
+            batch = []
+            list_size = 0
+            for index, length in zip(bucket.tolist(),
+                                     self.lengths[bucket].tolist()):
+                if len(batch) > 0 and not self._fits(
+                        len(batch) + 1, max(list_size, length)):
+                    batches.append(batch)
+                    batch = []
+                    list_size = 0
+                batch.append(index)
+                list_size = max(list_size, length)
+            if len(batch) > 0:
+                batches.append(batch)
+        return [batches[i] for i in
+                _permutation(len(batches), self.shuffle, self.rng_kw)]
+
+    def __iter__(self) -> Iterator[List[int]]:
+        batches = self._next_batches
+        if batches is None:
+            batches = self.batches()
+        self._next_batches = None
+        self.padding_ratio = padding_ratio(self.lengths, batches)
+        logging.debug("packed %d batches with a padding ratio of %.3f",
+                      len(batches), self.padding_ratio)
+        return iter(batches)
+
+    def __len__(self) -> int:
+        if self._next_batches is None:
+            self._next_batches = self.batches()
+        return len(self._next_batches)
@@ -1,3 +1,4 @@
+from typing import Iterable
 from typing import Optional
 import torch as _torch
 
@@ -12,6 +13,25 @@ class ListSampler:
             size = min(self._max_list_size, size)
         return size
 
+    def max_list_sizes(self, n: _torch.LongTensor,
+                       relevance: Optional[Iterable[_torch.LongTensor]] = None
+                       ) -> _torch.LongTensor:
+        """Returns the max list size of each of a batch of lists with given
+        numbers of documents, as :meth:`max_list_size` does for one list.
+
+        If a subclass overrides :meth:`max_list_size`, it is called on the
+        relevance labels of each list, which are then required.
+        """
+        if type(self).max_list_size is not ListSampler.max_list_size:
+            if relevance is None:
+                raise ValueError(
+                    "relevance is required when max_list_size is overridden")
+            return _torch.tensor([self.max_list_size(r) for r in relevance],
+                                 dtype=_torch.long)
+        if self._max_list_size is not None:
+            return n.clamp(max=self._max_list_size)
+        return n
+
     def __call__(self, relevance: _torch.LongTensor) -> _torch.LongTensor:
         return _torch.arange(self.max_list_size(relevance), dtype=_torch.long)
 
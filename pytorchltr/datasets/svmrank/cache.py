@@ -0,0 +1,126 @@
+"""Binary on-disk cache of parsed SVMRank-style data sets."""
+import logging
+import os
+import shutil
+import tempfile
+from typing import Dict
+from typing import Optional
+
+import numpy as _np
+
+
+_CACHE_VERSION = 1
+
+
+def cache_key(sha256: str, **options) -> str:
+    """Returns the name of the cache entry for a file and its load options.
+
+    Args:
+        sha256: The sha256 checksum of the file.
+        options: The options that affect the parsed arrays.
+
+    Returns:
+        A name that identifies the cache entry.
+    """
+    parts = ["%s_%s" % (name, options[name]) for name in sorted(options)]
+    return "-".join([sha256, "v%d" % _CACHE_VERSION] + parts)
+
+
+def load_cache(path: str) -> Optional[Dict[str, _np.ndarray]]:
+    """Memory-maps the arrays of the cache entry at given path.
+
+    The arrays are mapped copy-on-write: they can be modified in memory
+    without changing the cache entry on disk.
+
+    Args:
+        path: The path of the cache entry.
+
+    Returns:
+        A dict of arrays by name or None if the cache entry does not exist.
+    """
+    if not os.path.isdir(path):
+        return None
+    logging.info("loading cached arrays from '%s'", path)
+    return {
+        os.path.splitext(name)[0]: _np.load(os.path.join(path, name),
+                                            mmap_mode="c")
+        for name in os.listdir(path) if name.endswith(".npy")
+    }
+
+
+def file_stat(path: str) -> _np.ndarray:
+    """Returns the size and modification time (in nanoseconds) of the file at
+    given path, which identify the version of the file a cache entry was
+    created from.
+
+    Args:
+        path: The path of the file.
+
+    Returns:
+        An int64 array of the size and modification time.
+    """
+    stat = os.stat(path)
+    mtime_ns = getattr(stat, "st_mtime_ns", int(stat.st_mtime * 1e9))
+    return _np.array([stat.st_size, mtime_ns], dtype=_np.int64)
+
+
+def cache_matches_file(path: str, file: str) -> bool:
+    """Returns whether the cache entry at given path was created from (or
+    last checked against) the file as it is now, judged by its size and
+    modification time.
+
+    Args:
+        path: The path of the cache entry.
+        file: The path of the file.
+
+    Returns:
+        False if the cache entry, its recorded file stat or the file does not
+        exist, or if the file has changed.
+    """
+    try:
+        return _np.array_equal(
+            _np.load(os.path.join(path, "file_stat.npy")), file_stat(file))
+    except OSError:
+        return False
+
+
+def save_file_stat(path: str, file: str):
+    """Records the current size and modification time of given file in the
+    cache entry at given path, after its contents have been checked.
+
+    Args:
+        path: The path of the cache entry.
+        file: The path of the file.
+    """
+    tmp_path = os.path.join(path, "file_stat.npy.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            _np.save(f, file_stat(file))
+        os.replace(tmp_path, os.path.join(path, "file_stat.npy"))
+    except OSError:
+        logging.warning("could not update the cache entry at '%s'", path)
+
+
+def save_cache(path: str, arrays: Dict[str, _np.ndarray]):
+    """Writes given arrays to a new cache entry at given path.
+
+    The arrays are written to a temporary directory first which is then
+    renamed, so that a partially written cache entry is never loaded. If the
+    cache entry was created concurrently, the existing entry is kept.
+
+    Args:
+        path: The path of the cache entry.
+        arrays: A dict of arrays by name.
+    """
+    logging.info("writing cached arrays to '%s'", path)
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent)
+    try:
+        for name, array in arrays.items():
+            _np.save(os.path.join(tmp_path, name + ".npy"), array)
+        os.rename(tmp_path, path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if not os.path.isdir(path):
+            raise
@@ -1,11 +1,16 @@
 import os
+from typing import List
 from typing import Optional
 
+import numpy as np
+
 from pytorchltr.utils.downloader import DefaultDownloadProgress
 from pytorchltr.utils.downloader import Downloader
 from pytorchltr.utils.file import validate_and_download
 from pytorchltr.utils.file import extract_tar
 from pytorchltr.utils.file import dataset_dir
+from pytorchltr.utils.file import expected_sha256
+from pytorchltr.datasets.svmrank.svmrank import DefaultParseProgress
 from pytorchltr.datasets.svmrank.svmrank import SVMRankDataset
 
 
@@ -37,7 +42,9 @@ class IstellaX(SVMRankDataset):
     def __init__(self, location: str = dataset_dir("istella_x"),
                  split: str = "train", normalize: bool = True,
                  filter_queries: Optional[bool] = None, download: bool = True,
-                 validate_checksums: bool = True):
+                 validate_checksums: bool = True,
+                 num_threads: int = 1, dtype: np.dtype = np.float32,
+                 cache: bool = False, columns: Optional[List[int]] = None):
         """
         Args:
             location: Directory where the dataset is located.
@@ -51,11 +58,43 @@ class IstellaX(SVMRankDataset):
                 exist.
             validate_checksums: Whether to validate the dataset files
                 via sha256.
+            num_threads: The number of threads to use when parsing the
+                dataset file.
+            dtype: The dtype to store features in (float64, float32 or
+                float16).
+            cache: Whether to cache the parsed dataset in a binary format in
+                the dataset location, so that later loads memory-map it
+                instead of parsing the dataset file.
+            columns: (Optional) the feature indices (as they appear in the
+                dataset file) of the features to load. By default, all
+                features are loaded.
         """
         # Check if specified split exists.
         if split not in IstellaX.splits.keys():
             raise ValueError("unrecognized data split '%s'" % str(split))
 
+        # Only filter queries on non-train splits.
+        if filter_queries is None:
+            filter_queries = False if split == "train" else True
+
+        # Initialize the dataset.
+        datafile = os.path.join(location, IstellaX.splits[split])
+
+        # Cache the parsed dataset in the dataset location, identified by the
+        # listed checksum of the dataset file. Checksums are not validated
+        # again while the cache entry is up to date with the dataset file.
+        cache_dir = None
+        sha256 = None
+        if cache:
+            cache_dir = os.path.join(location, "cache")
+            sha256 = expected_sha256(
+                IstellaX.expected_files,
+                os.path.relpath(datafile, location))
+            if sha256 is not None and SVMRankDataset.is_cached(
+                    datafile, cache_dir, sha256, normalize=normalize,
+                    dtype=dtype, columns=columns):
+                validate_checksums = False
+
         # Validate dataset exists and is correct, or download it.
         validate_and_download(
             location=location,
@@ -63,11 +102,8 @@ class IstellaX(SVMRankDataset):
             downloader=IstellaX.downloader if download else None,
             validate_checksums=validate_checksums)
 
-        # Only filter queries on non-train splits.
-        if filter_queries is None:
-            filter_queries = False if split == "train" else True
-
-        # Initialize the dataset.
-        datafile = os.path.join(location, IstellaX.splits[split])
         super().__init__(file=datafile, sparse=False, normalize=normalize,
-                         filter_queries=filter_queries, zero_based="auto")
+                         filter_queries=filter_queries, zero_based="auto",
+                         num_threads=num_threads, dtype=dtype,
+                         cache_dir=cache_dir, sha256=sha256, columns=columns,
+                         progress_fn=DefaultParseProgress())
@@ -1,2 +1,6 @@
 from pytorchltr.datasets.svmrank.parser.svmrank_parser import \
     parse_svmrank_file  # noqa: F401
+from pytorchltr.datasets.svmrank.parser.svmrank_parser import \
+    iter_svmrank_file  # noqa: F401
+from pytorchltr.datasets.svmrank.parser.svmrank_parser import \
+    normalize_queries  # noqa: F401
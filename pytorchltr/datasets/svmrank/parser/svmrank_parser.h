@@ -1,9 +1,15 @@
 /*
  * This is a reasonably fast implementation to parse SVMrank files.
  * 
- * This implementation uses a DFA parser and performs a single pass over the
- * input. A second pass over in-memory data is performed to construct a dense
- * feature matrix.
+ * This implementation uses a DFA parser and performs two passes over the
+ * input. The first (count) pass validates the input and counts the number of
+ * rows, nonzero entries and the range of columns. The output is then
+ * allocated once, and the second (fill) pass decodes values directly into
+ * either a dense feature matrix or CSR arrays, so that no intermediate
+ * buffers are needed. The parser state is resumable, so a file can be split
+ * at line boundaries into chunks that are parsed independently (e.g. on
+ * separate threads). In streaming mode the parser instead decodes rows into
+ * growable buffers that the caller consumes as it goes.
  * 
  * This parser only supports ASCII-encoded SVMrank files using the format as
  * described in http://www.cs.cornell.edu/people/tj/svm_light/svm_rank.html.
@@ -14,7 +20,15 @@
 #include <stdio.h>
 #include <string.h>
 #include <stdlib.h>
-#include <math.h>
+#include <stdint.h>
+
+// Seeking that supports offsets beyond 2GB on all platforms.
+#ifdef _WIN32
+#define svmrank_fseek(fp, offset, whence) _fseeki64(fp, offset, whence)
+#else
+#include <sys/types.h>
+#define svmrank_fseek(fp, offset, whence) fseeko(fp, (off_t)(offset), whence)
+#endif
 
 // Constants
 #define SVMRANK_PARSER_BUFFER_SIZE 8192
@@ -23,6 +37,11 @@ const int PARSE_FILE_ERROR = 1;
 const int PARSE_FORMAT_ERROR = 2;
 const int PARSE_MEMORY_ERROR = 3;
 
+// Output feature dtypes
+const int DTYPE_FLOAT64 = 0;
+const int DTYPE_FLOAT32 = 1;
+const int DTYPE_FLOAT16 = 2;
+
 // Parser DFA states
 typedef enum {
     INVALID = 0,
@@ -42,7 +61,9 @@ typedef enum {
     PROCESS_FEAT_VAL_2 = 14,
     START_FEAT_VAL_3 = 15,
     PROCESS_FEAT_VAL_3 = 16,
-    SKIP = 17
+    SKIP = 17,
+    SKIP_FEAT_VAL = 18,
+    COMMENT = 19
 } state;
 
 // Parser DFA actions
@@ -64,6 +85,7 @@ typedef enum {
     UPDATE_FEAT_VAL_2,
     UPDATE_FEAT_VAL_3,
     STORE_FEAT_VAL,
+    CAPTURE_COMMENT,
 } action;
 
 // Matrix shape.
@@ -72,12 +94,15 @@ typedef struct shape {
     size_t cols;
 } shape;
 
-// DFA transition and action tables.
-unsigned char TRANSITIONS[32][256];
-unsigned char ACTIONS[32][256];
+// DFA transition and action tables. They are built once by
+// init_svmrank_parser() and only read afterwards, so that any number of
+// threads can run the parser concurrently.
+static unsigned char TRANSITIONS[32][256];
+static unsigned char ACTIONS[32][256];
+static int SVMRANK_PARSER_READY = 0;
 
 // Initializes the DFA transition table.
-void init_transition_table() {
+static void init_transition_table() {
     TRANSITIONS[START_Y]['#'] = SKIP;
     TRANSITIONS[START_Y][' '] = START_Y;
     for (unsigned char c='0'; c<='9'; c++) { TRANSITIONS[START_Y][c] = PROCESS_Y; }
@@ -91,11 +116,11 @@ void init_transition_table() {
     for (unsigned char c='0'; c<='9'; c++) { TRANSITIONS[START_QID_COLON][c] = PROCESS_QID; }
     for (unsigned char c='0'; c<='9'; c++) { TRANSITIONS[PROCESS_QID][c] = PROCESS_QID; }
     TRANSITIONS[PROCESS_QID][' '] = START_FEAT_COL;
-    TRANSITIONS[PROCESS_QID]['#'] = SKIP;
+    TRANSITIONS[PROCESS_QID]['#'] = COMMENT;
     TRANSITIONS[PROCESS_QID]['\r'] = SKIP;
     TRANSITIONS[PROCESS_QID]['\n'] = START_Y;
     TRANSITIONS[START_FEAT_COL][' '] = START_FEAT_COL;
-    TRANSITIONS[START_FEAT_COL]['#'] = SKIP;
+    TRANSITIONS[START_FEAT_COL]['#'] = COMMENT;
     TRANSITIONS[START_FEAT_COL]['\r'] = SKIP;
     TRANSITIONS[START_FEAT_COL]['\n'] = START_Y;
     for (unsigned char c='0'; c<='9'; c++) { TRANSITIONS[START_FEAT_COL][c] = PROCESS_FEAT_COL; }
@@ -104,10 +129,10 @@ void init_transition_table() {
     TRANSITIONS[START_FEAT_VAL_1]['-'] = START_FEAT_VAL_1;
     for (unsigned char c='0'; c<='9'; c++) { TRANSITIONS[START_FEAT_VAL_1][c] = PROCESS_FEAT_VAL_1; }
     for (unsigned char c='0'; c<='9'; c++) { TRANSITIONS[PROCESS_FEAT_VAL_1][c] = PROCESS_FEAT_VAL_1; }
-    TRANSITIONS[PROCESS_FEAT_VAL_2]['e'] = START_FEAT_VAL_3;
-    TRANSITIONS[PROCESS_FEAT_VAL_2]['E'] = START_FEAT_VAL_3;
+    TRANSITIONS[PROCESS_FEAT_VAL_1]['e'] = START_FEAT_VAL_3;
+    TRANSITIONS[PROCESS_FEAT_VAL_1]['E'] = START_FEAT_VAL_3;
     TRANSITIONS[PROCESS_FEAT_VAL_1][' '] = START_FEAT_COL;
-    TRANSITIONS[PROCESS_FEAT_VAL_1]['#'] = SKIP;
+    TRANSITIONS[PROCESS_FEAT_VAL_1]['#'] = COMMENT;
     TRANSITIONS[PROCESS_FEAT_VAL_1]['\r'] = SKIP;
     TRANSITIONS[PROCESS_FEAT_VAL_1]['\n'] = START_Y;
     TRANSITIONS[PROCESS_FEAT_VAL_1]['.'] = START_FEAT_VAL_2;
@@ -116,7 +141,7 @@ void init_transition_table() {
     TRANSITIONS[PROCESS_FEAT_VAL_2]['e'] = START_FEAT_VAL_3;
     TRANSITIONS[PROCESS_FEAT_VAL_2]['E'] = START_FEAT_VAL_3;
     TRANSITIONS[PROCESS_FEAT_VAL_2][' '] = START_FEAT_COL;
-    TRANSITIONS[PROCESS_FEAT_VAL_2]['#'] = SKIP;
+    TRANSITIONS[PROCESS_FEAT_VAL_2]['#'] = COMMENT;
     TRANSITIONS[PROCESS_FEAT_VAL_2]['\r'] = SKIP;
     TRANSITIONS[PROCESS_FEAT_VAL_2]['\n'] = START_Y;
     TRANSITIONS[START_FEAT_VAL_3]['-'] = PROCESS_FEAT_VAL_3;
@@ -124,15 +149,22 @@ void init_transition_table() {
     for (unsigned char c='0'; c<='9'; c++) { TRANSITIONS[START_FEAT_VAL_3][c] = PROCESS_FEAT_VAL_3; }
     for (unsigned char c='0'; c<='9'; c++) { TRANSITIONS[PROCESS_FEAT_VAL_3][c] = PROCESS_FEAT_VAL_3; }
     TRANSITIONS[PROCESS_FEAT_VAL_3][' '] = START_FEAT_COL;
-    TRANSITIONS[PROCESS_FEAT_VAL_3]['#'] = SKIP;
+    TRANSITIONS[PROCESS_FEAT_VAL_3]['#'] = COMMENT;
     TRANSITIONS[PROCESS_FEAT_VAL_3]['\r'] = SKIP;
     TRANSITIONS[PROCESS_FEAT_VAL_3]['\n'] = START_Y;
     for (size_t c=0; c<256; c++) { TRANSITIONS[SKIP][c] = SKIP; }
     TRANSITIONS[SKIP]['\n'] = START_Y;
+    for (size_t c=0; c<256; c++) { TRANSITIONS[SKIP_FEAT_VAL][c] = SKIP_FEAT_VAL; }
+    TRANSITIONS[SKIP_FEAT_VAL][' '] = START_FEAT_COL;
+    TRANSITIONS[SKIP_FEAT_VAL]['#'] = COMMENT;
+    TRANSITIONS[SKIP_FEAT_VAL]['\r'] = SKIP;
+    TRANSITIONS[SKIP_FEAT_VAL]['\n'] = START_Y;
+    for (size_t c=0; c<256; c++) { TRANSITIONS[COMMENT][c] = COMMENT; }
+    TRANSITIONS[COMMENT]['\n'] = START_Y;
 }
 
 // Initializes the DFA action table.
-void init_action_table() {
+static void init_action_table() {
     for (unsigned char c='0'; c<='9'; c++) { ACTIONS[START_Y][c] = PREPARE_Y; }
     for (unsigned char c='0'; c<='9'; c++) { ACTIONS[PROCESS_Y][c] = UPDATE_Y; }
     ACTIONS[PROCESS_Y][' '] = STORE_Y;
@@ -162,356 +194,723 @@ void init_action_table() {
     ACTIONS[PROCESS_FEAT_VAL_3]['#'] = STORE_FEAT_VAL;
     ACTIONS[PROCESS_FEAT_VAL_3]['\r'] = STORE_FEAT_VAL;
     ACTIONS[PROCESS_FEAT_VAL_3]['\n'] = STORE_FEAT_VAL;
+    for (size_t c=0; c<256; c++) { ACTIONS[COMMENT][c] = CAPTURE_COMMENT; }
+    ACTIONS[COMMENT]['\n'] = RESET;
 }
 
-// Init function
+// Init function, builds the tables on the first call only. It must be called
+// before any parsing starts and not concurrently with itself.
 void init_svmrank_parser() {
+    if (SVMRANK_PARSER_READY) {
+        return;
+    }
     init_transition_table();
     init_action_table();
+    SVMRANK_PARSER_READY = 1;
 }
 
-// Main SVMrank parse function.
-int parse_svmrank_file(char* path, double** xs_out, shape* xs_shape, int** ys_out, long** qids_out) {
+// Parsed output, either as a dense feature matrix or in CSR format.
+typedef struct svmrank_output {
+    void* xs;
+    int* indices;
+    long long* indptr;
+    int* ys;
+    long* qids;
+    char* comments;
+    long long* comment_offsets;
+    shape xs_shape;
+    unsigned long long nnz;
+    int dtype;
+    int csr;
+    int capture_comments;
+} svmrank_output;
+
+// Resumable parser state. During the count pass the output pointers are
+// NULL and the parser only counts rows, nonzero entries and columns. During
+// the fill pass the parser decodes each row directly into the output. In
+// streaming mode the output buffers are owned by the parser and grow as
+// needed.
+typedef struct svmrank_parser {
+
+    // DFA variables.
+    state current_state;
+
+    // The number of bytes fed to the parser so far, for progress reporting.
+    unsigned long long bytes_parsed;
 
-    // Main file reading variables.
-    char buffer[SVMRANK_PARSER_BUFFER_SIZE];
-    size_t bytes_read = 0;
-    long total_read = 0;
-    FILE* fp = fopen(path, "r");
+    // Current parse variables.
+    int y;
+    long qid;
+    unsigned long row;
+    unsigned long col;
+    unsigned long nr_cols;
+    unsigned long min_col;
+    int set_min_col;
+    unsigned long long nnz;
+    long decplaces;
+    long sign;
+    unsigned long long val;
+    long expval;
+    long expsign;
+
+    // Output targets for the fill pass. In CSR format, xs holds the values of
+    // the nonzero entries.
+    void* xs;
+    int xs_dtype;
+    int* indices;
+    long long* indptr;
+    int* ys;
+    long* qids;
+    unsigned long xs_rows;
+    unsigned long xs_cols;
+    unsigned long xs_min_col;
+    unsigned long long xs_nnz;
+    int stream;
+
+    // The comments that follow the '#' of each row, stored back to back
+    // (only captured in the fill pass if comments is set). The comments of a
+    // chunk end at comment_end, the size counted for it in the count pass.
+    // comment_cr is set while a '\r' at the end of a buffer is held back.
+    unsigned long long comment_bytes;
+    unsigned long long comment_end;
+    int comment_cr;
+    char* comments;
+    long long* comment_offsets;
+
+    // Optional column selection, mapping each column index in the file to
+    // its column in the output or to -1 if the column is dropped.
+    const int* col_map;
+    unsigned long col_map_size;
+} svmrank_parser;
+
+// Initializes the parser state for the count pass.
+void init_svmrank_parser_state(svmrank_parser* p) {
+    memset(p, 0, sizeof(svmrank_parser));
+    p->current_state = START_Y;
+    p->set_min_col = 1;
+    p->sign = 1;
+    p->expsign = 1;
+}
 
-    // If we cannot open the file for reading, return an appropriate error code.
-    if (fp == NULL) {
-        return PARSE_FILE_ERROR;
+// Selects the columns to parse. The column map maps each column index in
+// the file to its column in the output, or to -1 to drop the column. Columns
+// beyond the end of the map are dropped. The map should outlive the parser.
+void select_svmrank_columns(svmrank_parser* p, const int* col_map, unsigned long col_map_size) {
+    p->col_map = col_map;
+    p->col_map_size = col_map_size;
+}
+
+// Mantissa digits are accumulated while the mantissa is below this limit,
+// further digits are beyond double precision and are dropped.
+#define MAX_FEAT_VAL_MANTISSA 1000000000000000000ULL
+
+// Exponents beyond this limit overflow or underflow any double.
+#define MAX_FEAT_VAL_EXPONENT 100000
+
+// Powers of ten that are exactly representable as doubles.
+static const double POW10[] = {
+    1e0, 1e1, 1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9, 1e10, 1e11, 1e12,
+    1e13, 1e14, 1e15, 1e16, 1e17, 1e18, 1e19, 1e20, 1e21, 1e22
+};
+
+// Decodes a feature value from its parsed components. If the mantissa and
+// the power of ten are both exactly representable as doubles, a single
+// multiplication or division gives the correctly rounded value. Other values
+// (long mantissas or large exponents) are rare and are rounded by strtod.
+static inline double decode_feat_val(long sign, unsigned long long val, long expval, long expsign, long decplaces) {
+    double feat_val;
+    long exponent = (expval * expsign) - decplaces;
+    if (val <= (1ULL << 53) && exponent >= -22 && exponent <= 22) {
+        if (exponent < 0) {
+            feat_val = (double)val / POW10[-exponent];
+        } else {
+            feat_val = (double)val * POW10[exponent];
+        }
+    } else {
+        // Write "<val>e<exponent>" backwards from the end of the buffer.
+        char digits[48];
+        char* d = digits + sizeof(digits) - 1;
+        unsigned long e = exponent < 0 ? -exponent : exponent;
+        *d = '\0';
+        do { *--d = '0' + (e % 10); e /= 10; } while (e > 0);
+        if (exponent < 0) { *--d = '-'; }
+        *--d = 'e';
+        do { *--d = '0' + (val % 10); val /= 10; } while (val > 0);
+        feat_val = strtod(d, NULL);
     }
+    return sign < 0 ? -feat_val : feat_val;
+}
 
-    // Initialize DFA variables
-    action current_action = 0;
-    state current_state = START_Y;
+// Converts a double to the bits of the nearest IEEE 754 half-precision
+// float, rounding ties to even.
+static uint16_t double_to_half(double value) {
+    uint64_t bits;
+    memcpy(&bits, &value, sizeof(double));
+    uint16_t sign = (uint16_t)((bits >> 48) & 0x8000);
+    int64_t exponent = (int64_t)((bits >> 52) & 0x7ff);
+    uint64_t mantissa = bits & 0xfffffffffffffULL;
+
+    // Infinity and NaN.
+    if (exponent == 0x7ff) {
+        return sign | 0x7c00 | (mantissa != 0 ? 0x200 : 0);
+    }
 
-    // Current parse variables.
-    int y = 0;
-    long qid = 0;
-    unsigned long row = 0;
-    unsigned int col = 0;
-    unsigned long nr_cols = 0;
-    unsigned long min_col = 0;
-    int set_min_col = 1;
-    long decplaces = 0;
-    long sign = 1;
-    long val = 0;
-    long expval = 0;
-    long expsign = 1;
-    double feat_val = 0.0;
-
-    // Allocate output data holders
-    size_t ys_capacity = 100;
-    size_t ys_cursor = 0;
-    int* ys = malloc(ys_capacity * sizeof(int));
-    if (ys == NULL) {
-        fclose(fp);
-        return PARSE_MEMORY_ERROR;
+    // Overflow rounds to infinity.
+    exponent = exponent - 1023 + 15;
+    if (exponent >= 31) {
+        return sign | 0x7c00;
     }
-    int* realloc_ys;
-    size_t qids_capacity = 100;
-    size_t qids_cursor = 0;
-    long* qids = malloc(qids_capacity * sizeof(long));
-    if (qids == NULL) {
-        free(ys);
-        fclose(fp);
-        return PARSE_MEMORY_ERROR;
+
+    // Subnormal half-precision values (or zero), which have no implicit bit.
+    int shift = 42;
+    uint64_t half = 0;
+    if (exponent <= 0) {
+        if (exponent < -10) {
+            return sign;
+        }
+        mantissa |= 1ULL << 52;
+        shift = (int)(43 - exponent);
+    } else {
+        half = (uint64_t)exponent << 10;
     }
-    long* realloc_qids;
-    size_t rows_capacity = 1000;
-    size_t rows_cursor = 0;
-    long* rows = malloc(rows_capacity * sizeof(long));
-    if (rows == NULL) {
-        free(ys);
-        free(qids);
-        fclose(fp);
+
+    // Round to nearest, ties to even. A carry from the mantissa correctly
+    // increments the exponent (and may round up to infinity).
+    uint64_t remainder = mantissa & ((1ULL << shift) - 1);
+    uint64_t halfway = 1ULL << (shift - 1);
+    half += mantissa >> shift;
+    if (remainder > halfway || (remainder == halfway && (half & 1))) {
+        half += 1;
+    }
+    return sign | (uint16_t)half;
+}
+
+// Returns the size in bytes of an element of given output dtype.
+size_t svmrank_dtype_size(int dtype) {
+    if (dtype == DTYPE_FLOAT32) {
+        return sizeof(float);
+    } else if (dtype == DTYPE_FLOAT16) {
+        return sizeof(uint16_t);
+    }
+    return sizeof(double);
+}
+
+// Maps a column index in the file to its column in the output. Returns 0 if
+// the column is dropped by the column selection.
+static inline int map_svmrank_col(const svmrank_parser* p, unsigned long col, unsigned long* out_col) {
+    if (p->col_map == NULL) {
+        *out_col = col - p->xs_min_col;
+        return 1;
+    }
+    if (col >= p->col_map_size || p->col_map[col] < 0) {
+        return 0;
+    }
+    *out_col = (unsigned long)p->col_map[col];
+    return 1;
+}
+
+// Stores a feature value in the output of the fill pass. The value is the
+// nnz-th nonzero entry, which determines its position in CSR format.
+static inline int store_feat_val(svmrank_parser* p, unsigned long row, unsigned long out_col, unsigned long long nnz, double feat_val) {
+    if (out_col >= p->xs_cols) {
+        return PARSE_FORMAT_ERROR;
+    }
+    size_t index = (row - 1) * p->xs_cols + out_col;
+    if (p->indices != NULL) {
+        if (nnz >= p->xs_nnz) {
+            return PARSE_FORMAT_ERROR;
+        }
+        index = (size_t)nnz;
+        p->indices[index] = (int)out_col;
+    }
+    switch (p->xs_dtype) {
+        case DTYPE_FLOAT32:
+            ((float*)p->xs)[index] = (float)feat_val;
+            break;
+        case DTYPE_FLOAT16:
+            ((uint16_t*)p->xs)[index] = double_to_half(feat_val);
+            break;
+        default:
+            ((double*)p->xs)[index] = feat_val;
+            break;
+    }
+    return PARSE_OK;
+}
+
+// Grows the output buffers of a streaming parser by 50%.
+static int grow_svmrank_stream(svmrank_parser* p) {
+    unsigned long rows = 1 + (p->xs_rows * 3 / 2);
+    void* xs = realloc(p->xs, rows * p->xs_cols * svmrank_dtype_size(p->xs_dtype) + 1);
+    if (xs == NULL) {
         return PARSE_MEMORY_ERROR;
     }
-    long* realloc_rows;
-    size_t cols_capacity = 1000;
-    size_t cols_cursor = 0;
-    int* cols = malloc(cols_capacity * sizeof(int));
-    if (cols == NULL) {
-        free(ys);
-        free(qids);
-        free(rows);
-        fclose(fp);
+    p->xs = xs;
+    int* ys = realloc(p->ys, rows * sizeof(int));
+    if (ys == NULL) {
         return PARSE_MEMORY_ERROR;
     }
-    int* realloc_cols;
-    size_t vals_capacity = 1000;
-    size_t vals_cursor = 0;
-    double* vals = malloc(vals_capacity * sizeof(double));
-    if (vals == NULL) {
-        free(ys);
-        free(qids);
-        free(rows);
-        free(cols);
-        fclose(fp);
+    p->ys = ys;
+    long* qids = realloc(p->qids, rows * sizeof(long));
+    if (qids == NULL) {
         return PARSE_MEMORY_ERROR;
     }
-    double* realloc_vals;
-
-    // Read file in buffer-sized chunks and parse them.
-    do {
-        bytes_read = fread(buffer, sizeof(char), SVMRANK_PARSER_BUFFER_SIZE, fp);
-        total_read += bytes_read;
-
-        // Iterate each character in the current buffer.
-        for (size_t i=0; i<bytes_read; i++) {
-            unsigned char c = buffer[i];
+    p->qids = qids;
+    p->xs_rows = rows;
+    return PARSE_OK;
+}
 
-            // Get the DFA action to perform given the current state and char.
-            current_action = ACTIONS[current_state][c];
+// Copies the current parse variables from the parser state into local
+// variables, so they can be kept in registers in the parse loop.
+#define LOAD_PARSE_VARIABLES(p) \
+    int y = p->y; \
+    long qid = p->qid; \
+    unsigned long row = p->row; \
+    unsigned long col = p->col; \
+    unsigned long long nnz = p->nnz; \
+    long decplaces = p->decplaces; \
+    long sign = p->sign; \
+    unsigned long long val = p->val; \
+    long expval = p->expval; \
+    long expsign = p->expsign;
+
+// Copies the local parse variables back into the parser state.
+#define SAVE_PARSE_VARIABLES(p) \
+    p->y = y; \
+    p->qid = qid; \
+    p->row = row; \
+    p->col = col; \
+    p->nnz = nnz; \
+    p->decplaces = decplaces; \
+    p->sign = sign; \
+    p->val = val; \
+    p->expval = expval; \
+    p->expsign = expsign;
+
+// Feeds the next piece of input to the parser.
+int parse_svmrank_buffer(svmrank_parser* p, const char* buffer, size_t size) {
 
-            // Execute the DFA action.
-            switch (current_action) {
-                case RESET:
-                    break;
-                case PREPARE_Y:
-                    row += 1;
-                    y = c - '0';
-                    break;
-                case UPDATE_Y:
-                    y = y * 10 + (c - '0');
-                    break;
-                case STORE_Y:
-                    if (ys_cursor >= ys_capacity) {
-                        ys_capacity = 1 + (ys_cursor * 3 / 2);
-                        realloc_ys = realloc(
-                            ys, ys_capacity * sizeof(int));
-                        if (realloc_ys == NULL) {
-                            free(ys);
-                            free(qids);
-                            free(rows);
-                            free(cols);
-                            free(vals);
-                            fclose(fp);
-                            return PARSE_MEMORY_ERROR;
-                        }
-                        ys = realloc_ys;
+    // Initialize DFA variables
+    action current_action = 0;
+    state current_state = p->current_state;
+    int result = PARSE_OK;
+
+    // Initialize parse variables and output targets.
+    LOAD_PARSE_VARIABLES(p)
+    void* xs = p->xs;
+    long long* indptr = p->indptr;
+    int* ys = p->ys;
+    long* qids = p->qids;
+    unsigned long out_col;
+
+    // Iterate each character in the buffer.
+    for (size_t i=0; i<size; i++) {
+        unsigned char c = buffer[i];
+
+        // Get the DFA action to perform given the current state and char.
+        current_action = ACTIONS[current_state][c];
+
+        // Execute the DFA action.
+        switch (current_action) {
+            case RESET:
+                break;
+            case PREPARE_Y:
+                row += 1;
+                if (ys != NULL && row > p->xs_rows) {
+                    if (!p->stream) {
+                        return PARSE_FORMAT_ERROR;
                     }
-                    ys[ys_cursor] = y;
-                    ys_cursor += 1;
-                    break;
-                case PREPARE_QID:
-                    qid = c - '0';
-                    break;
-                case UPDATE_QID:
-                    qid = qid * 10 + (c - '0');
-                    break;
-                case STORE_QID:
-                    if (qids_cursor >= qids_capacity) {
-                        qids_capacity = 1 + (qids_cursor * 3 / 2);
-                        realloc_qids = realloc(
-                            qids, qids_capacity * sizeof(long));
-                        if (realloc_qids == NULL) {
-                            free(ys);
-                            free(qids);
-                            free(rows);
-                            free(cols);
-                            free(vals);
-                            fclose(fp);
-                            return PARSE_MEMORY_ERROR;
-                        }
-                        qids = realloc_qids;
+                    if (grow_svmrank_stream(p) != PARSE_OK) {
+                        return PARSE_MEMORY_ERROR;
                     }
-                    qids[qids_cursor] = qid;
-                    qids_cursor += 1;
-                    break;
-                case PREPARE_FEAT_COL:
-                    col = c - '0';
-                    sign = 1;
-                    decplaces = 0;
-                    expsign = 1;
-                    expval = 0;
-                    break;
-                case UPDATE_FEAT_COL:
-                    col = col * 10 + (c - '0');
-                    break;
-                case STORE_FEAT_COL:
-                    if (rows_cursor >= rows_capacity) {
-                        rows_capacity = 1 + (rows_cursor * 3 / 2);
-                        realloc_rows = realloc(
-                            rows, rows_capacity * sizeof(long));
-                        if (realloc_rows == NULL) {
-                            free(ys);
-                            free(qids);
-                            free(rows);
-                            free(cols);
-                            free(vals);
-                            fclose(fp);
-                            return PARSE_MEMORY_ERROR;
-                        }
-                        rows = realloc_rows;
+                    xs = p->xs;
+                    ys = p->ys;
+                    qids = p->qids;
+                }
+                if (p->stream) {
+                    size_t row_size = p->xs_cols * svmrank_dtype_size(p->xs_dtype);
+                    memset((char*)xs + (row - 1) * row_size, 0, row_size);
+                }
+                if (indptr != NULL) {
+                    indptr[row - 1] = nnz;
+                }
+                if (p->comment_offsets != NULL) {
+                    p->comment_offsets[row - 1] = p->comment_bytes;
+                }
+                p->comment_cr = 0;
+                y = c - '0';
+                break;
+            case UPDATE_Y:
+                y = y * 10 + (c - '0');
+                break;
+            case STORE_Y:
+                if (ys != NULL) {
+                    ys[row - 1] = y;
+                }
+                break;
+            case PREPARE_QID:
+                qid = c - '0';
+                break;
+            case UPDATE_QID:
+                qid = qid * 10 + (c - '0');
+                break;
+            case STORE_QID:
+                if (qids != NULL) {
+                    qids[row - 1] = qid;
+                }
+                break;
+            case PREPARE_FEAT_COL:
+                col = c - '0';
+                sign = 1;
+                decplaces = 0;
+                expsign = 1;
+                expval = 0;
+                break;
+            case UPDATE_FEAT_COL:
+                col = col * 10 + (c - '0');
+                break;
+            case STORE_FEAT_COL:
+                if (xs == NULL) {
+                    if (p->set_min_col == 1 || col < p->min_col) {
+                        p->min_col = col;
+                        p->set_min_col = 0;
                     }
-                    rows[rows_cursor] = row - 1;
-                    rows_cursor += 1;
-                    if (cols_cursor >= cols_capacity) {
-                        cols_capacity = 1 + (cols_cursor * 3 / 2);
-                        realloc_cols = realloc(
-                            cols, cols_capacity * sizeof(int));
-                        if (realloc_cols == NULL) {
-                            free(ys);
-                            free(qids);
-                            free(rows);
-                            free(cols);
-                            free(vals);
-                            fclose(fp);
-                            return PARSE_MEMORY_ERROR;
-                        }
-                        cols = realloc_cols;
+                    if (col + 1 > p->nr_cols) {
+                        p->nr_cols = col + 1;
                     }
-                    cols[cols_cursor] = col;
-                    cols_cursor += 1;
-
-                    if (set_min_col == 1 || col < min_col) {
-                        min_col = col;
-                        set_min_col = 0;
-                    }
-                    if (col + 1 > nr_cols) {
-                        nr_cols = col + 1;
+                } else if (!map_svmrank_col(p, col, &out_col)) {
+                    // The count pass has validated the input, so the value
+                    // of a dropped column is skipped up to its delimiter.
+                    while (i + 1 < size && buffer[i + 1] != ' ' && buffer[i + 1] != '\n' &&
+                           buffer[i + 1] != '\r' && buffer[i + 1] != '#') {
+                        i++;
                     }
-                    break;
-                case SET_FEAT_VAL_NEGATIVE:
-                    sign = -1;
-                    break;
-                case PREPARE_FEAT_VAL:
-                    val = c - '0';
-                    break;
-                case UPDATE_FEAT_VAL_2:
-                    decplaces += 1;
-                case UPDATE_FEAT_VAL_1:
+                    current_state = SKIP_FEAT_VAL;
+                    continue;
+                }
+                break;
+            case SET_FEAT_VAL_NEGATIVE:
+                sign = -1;
+                break;
+            case PREPARE_FEAT_VAL:
+                val = c - '0';
+                break;
+            case UPDATE_FEAT_VAL_1:
+                if (val < MAX_FEAT_VAL_MANTISSA) {
                     val = val * 10 + (c - '0');
-                    break;
-                case SET_FEAT_VAL_EXP_NEGATIVE:
-                    expsign = -1;
-                    break;
-                case UPDATE_FEAT_VAL_3:
+                } else {
+                    decplaces -= 1;
+                }
+                break;
+            case UPDATE_FEAT_VAL_2:
+                if (val < MAX_FEAT_VAL_MANTISSA) {
+                    val = val * 10 + (c - '0');
+                    decplaces += 1;
+                }
+                break;
+            case SET_FEAT_VAL_EXP_NEGATIVE:
+                expsign = -1;
+                break;
+            case UPDATE_FEAT_VAL_3:
+                if (expval < MAX_FEAT_VAL_EXPONENT) {
                     expval = expval * 10 + (c - '0');
+                }
+                break;
+            case STORE_FEAT_VAL:
+                if (!map_svmrank_col(p, col, &out_col)) {
                     break;
-                case STORE_FEAT_VAL:
-                    feat_val = (double)(sign * val);
-                    expval = (expval * expsign) - decplaces;
-                    feat_val = feat_val * pow(10, (double)expval);
-                    if (vals_cursor >= vals_capacity) {
-                        vals_capacity = 1 + (vals_cursor * 3 / 2);
-                        realloc_vals = realloc(
-                            vals, vals_capacity * sizeof(double));
-                        if (realloc_vals == NULL) {
-                            free(ys);
-                            free(qids);
-                            free(rows);
-                            free(cols);
-                            free(vals);
-                            fclose(fp);
-                            return PARSE_MEMORY_ERROR;
-                        }
-                        vals = realloc_vals;
+                }
+                if (xs != NULL) {
+                    result = store_feat_val(p, row, out_col, nnz, decode_feat_val(
+                        sign, val, expval, expsign, decplaces));
+                    if (result != PARSE_OK) {
+                        return result;
                     }
-                    vals[vals_cursor] = feat_val;
-                    vals_cursor += 1;
-                    break;
-                default:
-                    break;
+                }
+                nnz += 1;
+                break;
+            case CAPTURE_COMMENT: {
+                // Consume the rest of the comment on this line at once. A
+                // '\r' that ends the line is not part of the comment. If the
+                // buffer ends with a '\r', it is held back until the comment
+                // continues in the next buffer.
+                const char* end = memchr(buffer + i, '\n', size - i);
+                size_t length = end != NULL ? (size_t)(end - (buffer + i)) : size - i;
+                int trailing_cr = buffer[i + length - 1] == '\r';
+                size_t copy_length = length - trailing_cr;
+                size_t held_cr = p->comment_cr;
+                if (p->comments != NULL) {
+                    if (p->comment_bytes + held_cr + copy_length > p->comment_end) {
+                        return PARSE_FORMAT_ERROR;
+                    }
+                    if (held_cr) {
+                        p->comments[p->comment_bytes] = '\r';
+                    }
+                    memcpy(p->comments + p->comment_bytes + held_cr, buffer + i, copy_length);
+                }
+                p->comment_bytes += held_cr + copy_length;
+                p->comment_cr = end == NULL && trailing_cr;
+                i += length - 1;
+                continue;
             }
+            default:
+                break;
+        }
 
-            // Get next state to go to given current state and char.
-            char next_state = TRANSITIONS[current_state][c];
-
-            // Return an appropriate error code if parsing fails due to invalid
-            // format.
-            if (next_state == INVALID) {
-                free(ys);
-                free(qids);
-                free(rows);
-                free(cols);
-                free(vals);
-                fclose(fp);
-                return PARSE_FORMAT_ERROR;
-            }
+        // Get next state to go to given current state and char.
+        char next_state = TRANSITIONS[current_state][c];
 
-            // Perform DFA state transition.
-            current_state = next_state;
+        // Return an appropriate error code if parsing fails due to invalid
+        // format.
+        if (next_state == INVALID) {
+            return PARSE_FORMAT_ERROR;
         }
-    } while (bytes_read == SVMRANK_PARSER_BUFFER_SIZE);
 
-    // If end of file is reached while parsing a feature value, finish processing it.
-    if (current_state == PROCESS_FEAT_VAL_1 || current_state == PROCESS_FEAT_VAL_2 || current_state == PROCESS_FEAT_VAL_3) {
-        feat_val = (double)val;
-        expval = (expval * expsign) - decplaces;
-        feat_val = feat_val * pow(10, (double)expval);
-        if (vals_cursor >= vals_capacity) {
-            vals_capacity = 1 + (vals_capacity * 3 / 2);
-            realloc_vals = realloc(
-                vals, vals_capacity * sizeof(double));
-            if (realloc_vals == NULL) {
-                free(ys);
-                free(qids);
-                free(rows);
-                free(cols);
-                free(vals);
-                fclose(fp);
-                return PARSE_MEMORY_ERROR;
+        // Perform DFA state transition.
+        current_state = next_state;
+    }
+
+    // Save DFA state so parsing can resume with the next piece of input.
+    SAVE_PARSE_VARIABLES(p)
+    p->current_state = current_state;
+    p->bytes_parsed += size;
+    return PARSE_OK;
+}
+
+// Finishes parsing after all input has been fed to the parser.
+int finish_svmrank_parser(svmrank_parser* p) {
+
+    // If end of input is reached while parsing a feature value, finish processing it.
+    unsigned long out_col;
+    if (p->current_state == PROCESS_FEAT_VAL_1 || p->current_state == PROCESS_FEAT_VAL_2 || p->current_state == PROCESS_FEAT_VAL_3) {
+        if (map_svmrank_col(p, p->col, &out_col)) {
+            if (p->xs != NULL && store_feat_val(p, p->row, out_col, p->nnz, decode_feat_val(
+                    p->sign, p->val, p->expval, p->expsign, p->decplaces)) != PARSE_OK) {
+                return PARSE_FORMAT_ERROR;
             }
-            vals = realloc_vals;
+            p->nnz += 1;
         }
-        vals[vals_cursor] = feat_val;
-        vals_cursor += 1;
+        p->current_state = START_Y;
+    }
+    return PARSE_OK;
+}
+
+// Parses the byte range [start, end) of the file at given path. The range
+// should start at the beginning of a line. An end < 0 parses until the end
+// of the file.
+int parse_svmrank_file_range(svmrank_parser* p, char* path, long long start, long long end) {
+
+    // Main file reading variables.
+    char buffer[SVMRANK_PARSER_BUFFER_SIZE];
+    size_t bytes_to_read = SVMRANK_PARSER_BUFFER_SIZE;
+    size_t bytes_read = 0;
+    int result = PARSE_OK;
+    FILE* fp = fopen(path, "rb");
+
+    // If we cannot open the file for reading, return an appropriate error code.
+    if (fp == NULL) {
+        return PARSE_FILE_ERROR;
+    }
+    if (start > 0 && svmrank_fseek(fp, start, SEEK_SET) != 0) {
+        fclose(fp);
+        return PARSE_FILE_ERROR;
     }
 
+    // Read file in buffer-sized chunks and parse them.
+    do {
+        if (end >= 0 && end - start < SVMRANK_PARSER_BUFFER_SIZE) {
+            bytes_to_read = (size_t)(end - start);
+        }
+        bytes_read = fread(buffer, sizeof(char), bytes_to_read, fp);
+        start += bytes_read;
+        result = parse_svmrank_buffer(p, buffer, bytes_read);
+        if (result != PARSE_OK) {
+            fclose(fp);
+            return result;
+        }
+    } while (bytes_read == SVMRANK_PARSER_BUFFER_SIZE);
+
     // Close file.
     fclose(fp);
 
-    // Construct dense output matrix.
-    double* xs = calloc((nr_cols - min_col) * row, sizeof(double));
-    if (xs == NULL) {
-        free(ys);
-        free(qids);
-        free(rows);
-        free(cols);
-        free(vals);
-        return PARSE_MEMORY_ERROR;
+    return finish_svmrank_parser(p);
+}
+
+// Allocates the output after the count pass over consecutive chunks of input
+// and prepares each chunk's parser to fill its rows during the fill pass. The
+// dtype and csr fields of the output determine the output format.
+int prepare_svmrank_fill(svmrank_parser** parsers, size_t nr_parsers, svmrank_output* out) {
+
+    // Compute the output shape over all chunks.
+    unsigned long nr_rows = 0;
+    unsigned long nr_cols = 0;
+    unsigned long min_col = 0;
+    unsigned long long nnz = 0;
+    unsigned long long comment_bytes = 0;
+    int set_min_col = 1;
+    for (size_t i=0; i<nr_parsers; i++) {
+        svmrank_parser* p = parsers[i];
+        nr_rows += p->row;
+        nnz += p->nnz;
+        comment_bytes += p->comment_bytes;
+        if (p->set_min_col == 0 && (set_min_col == 1 || p->min_col < min_col)) {
+            min_col = p->min_col;
+            set_min_col = 0;
+        }
+        if (p->nr_cols > nr_cols) {
+            nr_cols = p->nr_cols;
+        }
     }
-    for (size_t i=0; i<vals_cursor; i++) {
-        xs[rows[i] * (nr_cols - min_col) + cols[i] - min_col] = vals[i];
+    unsigned long xs_cols = nr_cols - min_col;
+
+    // With a column selection, the output only holds the selected columns.
+    const int* col_map = nr_parsers > 0 ? parsers[0]->col_map : NULL;
+    unsigned long col_map_size = nr_parsers > 0 ? parsers[0]->col_map_size : 0;
+    if (col_map != NULL) {
+        min_col = 0;
+        xs_cols = 0;
+        for (unsigned long i=0; i<col_map_size; i++) {
+            if (col_map[i] >= 0 && (unsigned long)col_map[i] + 1 > xs_cols) {
+                xs_cols = (unsigned long)col_map[i] + 1;
+            }
+        }
     }
 
-    // Free used resources.
-    free(rows);
-    free(cols);
-    free(vals);
-
-    // Shrink ys to correct size
-    realloc_ys = realloc(ys, (1 + ys_cursor) * sizeof(int));
-    if (realloc_ys == NULL) {
+    // Allocate output data holders.
+    size_t dtype_size = svmrank_dtype_size(out->dtype);
+    char* xs = NULL;
+    int* indices = NULL;
+    long long* indptr = NULL;
+    if (out->csr) {
+        xs = malloc((1 + nnz) * dtype_size);
+        indices = malloc((1 + nnz) * sizeof(int));
+        indptr = malloc((1 + nr_rows) * sizeof(long long));
+    } else {
+        xs = calloc(1 + xs_cols * nr_rows, dtype_size);
+    }
+    int* ys = calloc(1 + nr_rows, sizeof(int));
+    long* qids = calloc(1 + nr_rows, sizeof(long));
+    char* comments = NULL;
+    long long* comment_offsets = NULL;
+    if (out->capture_comments) {
+        comments = malloc(1 + comment_bytes);
+        comment_offsets = malloc((1 + nr_rows) * sizeof(long long));
+    }
+    if (xs == NULL || ys == NULL || qids == NULL || (out->csr && (indices == NULL || indptr == NULL)) ||
+            (out->capture_comments && (comments == NULL || comment_offsets == NULL))) {
+        free(xs);
+        free(indices);
+        free(indptr);
         free(ys);
         free(qids);
+        free(comments);
+        free(comment_offsets);
         return PARSE_MEMORY_ERROR;
     }
-    ys = realloc_ys;
 
-    // Shrink qids to correct size
-    realloc_qids = realloc(qids, (1 + qids_cursor) * sizeof(long));
-    if (realloc_qids == NULL) {
-        free(ys);
-        free(qids);
-        return PARSE_MEMORY_ERROR;
+    // Point each chunk's parser at its rows, offset by the preceding chunks.
+    unsigned long row_offset = 0;
+    unsigned long long nnz_offset = 0;
+    unsigned long long comment_offset = 0;
+    for (size_t i=0; i<nr_parsers; i++) {
+        svmrank_parser* p = parsers[i];
+        unsigned long chunk_rows = p->row;
+        unsigned long long chunk_nnz = p->nnz;
+        unsigned long long chunk_comment_bytes = p->comment_bytes;
+        init_svmrank_parser_state(p);
+        if (out->capture_comments) {
+            p->comments = comments;
+            p->comment_offsets = comment_offsets + row_offset;
+            p->comment_bytes = comment_offset;
+            p->comment_end = comment_offset + chunk_comment_bytes;
+        }
+        p->col_map = col_map;
+        p->col_map_size = col_map_size;
+        if (out->csr) {
+            p->xs = xs;
+            p->indices = indices;
+            p->indptr = indptr + row_offset;
+            p->nnz = nnz_offset;
+        } else {
+            p->xs = xs + row_offset * xs_cols * dtype_size;
+        }
+        p->xs_dtype = out->dtype;
+        p->ys = ys + row_offset;
+        p->qids = qids + row_offset;
+        p->xs_rows = chunk_rows;
+        p->xs_cols = xs_cols;
+        p->xs_min_col = min_col;
+        p->xs_nnz = nnz_offset + chunk_nnz;
+        row_offset += chunk_rows;
+        nnz_offset += chunk_nnz;
+        comment_offset += chunk_comment_bytes;
+    }
+    if (out->csr) {
+        indptr[nr_rows] = nnz;
+    }
+    if (out->capture_comments) {
+        comment_offsets[nr_rows] = comment_bytes;
     }
-    qids = realloc_qids;
 
     // Set output variables
-    *xs_out = xs;
-    *ys_out = ys;
-    *qids_out = qids;
-    xs_shape->rows = row;
-    xs_shape->cols = nr_cols - min_col;
+    out->xs = xs;
+    out->indices = indices;
+    out->indptr = indptr;
+    out->ys = ys;
+    out->qids = qids;
+    out->comments = comments;
+    out->comment_offsets = comment_offsets;
+    out->xs_shape.rows = nr_rows;
+    out->xs_shape.cols = xs_cols;
+    out->nnz = nnz;
 
     // Return success.
     return PARSE_OK;
 }
 
-#endif
\ No newline at end of file
+// Initializes the parser state for streaming. Rows are decoded into dense
+// buffers owned by the parser, using given dtype and column range.
+int init_svmrank_stream(svmrank_parser* p, int dtype, unsigned long min_col, unsigned long nr_cols) {
+    init_svmrank_parser_state(p);
+    p->stream = 1;
+    p->xs_dtype = dtype;
+    p->xs_min_col = min_col;
+    p->xs_cols = nr_cols > min_col ? nr_cols - min_col : 0;
+    p->xs_rows = 1000;
+    return grow_svmrank_stream(p);
+}
+
+// Removes the first given number of rows from the buffers of a streaming
+// parser, moving the remaining (possibly partially parsed) rows to the front.
+void consume_svmrank_stream(svmrank_parser* p, unsigned long rows) {
+    if (rows > p->row) {
+        rows = p->row;
+    }
+    size_t row_size = p->xs_cols * svmrank_dtype_size(p->xs_dtype);
+    memmove(p->xs, (char*)p->xs + rows * row_size, (p->row - rows) * row_size);
+    memmove(p->ys, p->ys + rows, (p->row - rows) * sizeof(int));
+    memmove(p->qids, p->qids + rows, (p->row - rows) * sizeof(long));
+    p->row -= rows;
+}
+
+// Frees the buffers of a streaming parser.
+void free_svmrank_stream(svmrank_parser* p) {
+    free(p->xs);
+    free(p->ys);
+    free(p->qids);
+    p->xs = NULL;
+    p->ys = NULL;
+    p->qids = NULL;
+}
+
+// Frees the output.
+void free_svmrank_output(svmrank_output* out) {
+    free(out->xs);
+    free(out->indices);
+    free(out->indptr);
+    free(out->ys);
+    free(out->qids);
+    free(out->comments);
+    free(out->comment_offsets);
+}
+
+#endif
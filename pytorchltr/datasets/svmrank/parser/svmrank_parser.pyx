@@ -1,5 +1,19 @@
+import bz2
+import gzip
+import logging
+import lzma
+import mmap
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+cimport cython
 cimport numpy as np
 import numpy as np
+from cython cimport view
+from libc.stdlib cimport malloc, free
+from libc.string cimport memset
 
 
 cdef extern from "errno.h":
@@ -10,50 +24,725 @@ cdef extern from "svmrank_parser.h":
     cdef struct shape:
         unsigned long cols
         unsigned long rows
+    ctypedef struct svmrank_parser:
+        unsigned long long bytes_parsed
+        unsigned long row
+        unsigned long long nnz
+        unsigned long nr_cols
+        unsigned long min_col
+        void* xs
+        int* ys
+        long* qids
+        unsigned long xs_cols
+    ctypedef struct svmrank_output:
+        void* xs
+        int* indices
+        long long* indptr
+        int* ys
+        long* qids
+        char* comments
+        long long* comment_offsets
+        shape xs_shape
+        unsigned long long nnz
+        int dtype
+        int csr
+        int capture_comments
     int PARSE_OK
     int PARSE_FILE_ERROR
     int PARSE_FORMAT_ERROR
     int PARSE_MEMORY_ERROR
-    int c_parse_svmrank_file "parse_svmrank_file" (char* path, double** xs, shape* xs_shape, int** ys, long** qids) nogil
+    int DTYPE_FLOAT64
+    int DTYPE_FLOAT32
+    int DTYPE_FLOAT16
     void init_svmrank_parser()
+    void init_svmrank_parser_state(svmrank_parser* p) nogil
+    void select_svmrank_columns(svmrank_parser* p, const int* col_map, unsigned long col_map_size) nogil
+    int parse_svmrank_buffer(svmrank_parser* p, const char* buffer, size_t size) nogil
+    int finish_svmrank_parser(svmrank_parser* p) nogil
+    int parse_svmrank_file_range(svmrank_parser* p, char* path, long long start, long long end) nogil
+    int prepare_svmrank_fill(svmrank_parser** parsers, size_t nr_parsers, svmrank_output* out) nogil
+    void free_svmrank_output(svmrank_output* out) nogil
+    int init_svmrank_stream(svmrank_parser* p, int dtype, unsigned long min_col, unsigned long nr_cols) nogil
+    void consume_svmrank_stream(svmrank_parser* p, unsigned long rows) nogil
+    void free_svmrank_stream(svmrank_parser* p) nogil
 
 
-def parse_svmrank_file(path):
-    global errno
+# Build the DFA tables once. They are only read afterwards, so the parser can
+# be called from several threads concurrently.
+init_svmrank_parser()
 
-    # Initialize pointers
-    cdef int* ys
-    cdef long* qids
-    cdef double* xs
-    cdef shape xs_shape
 
-    # Initialize path to read file from
-    py_path_bytes = path.encode('UTF-8')
-    cdef char* c_path = py_path_bytes
-    cdef int result = 0
+# The number of bytes of an in-memory buffer that are parsed at a time.
+cdef size_t _PROGRESS_SLICE_SIZE = 1 << 24
 
-    # Initialize output array views
-    cdef int[:] ys_view
-    cdef long[:] qids_view
-    cdef double[:,:] xs_view
 
-    # Init parser and parse file
-    init_svmrank_parser()
-    with nogil:
-        result = c_parse_svmrank_file(c_path, &xs, &xs_shape, &ys, &qids)
+cdef class _SVMRankChunk:
+    """Parser state for a single chunk of an SVMrank file."""
+    cdef svmrank_parser parser
+    cdef object col_map
 
-    if result == PARSE_OK:
-        ys_view = <int[:xs_shape.rows]> ys
-        ys_np = np.asarray(ys_view)
-        qids_view = <long[:xs_shape.rows]> qids
-        qids_np = np.asarray(qids_view)
-        xs_view = <double[:xs_shape.rows,:xs_shape.cols]> xs
-        xs_np = np.asarray(xs_view)
+    def __cinit__(self):
+        init_svmrank_parser_state(&self.parser)
 
-        return xs_np, ys_np, qids_np
-    elif result == PARSE_FILE_ERROR:
+    def select_columns(self, const int[::1] col_map):
+        """Only parses the columns selected by given column map."""
+        self.col_map = col_map
+        select_svmrank_columns(&self.parser, &col_map[0], col_map.shape[0])
+
+    def column_range(self):
+        """Returns the (min_col, nr_cols) range of columns that was counted."""
+        return self.parser.min_col, self.parser.nr_cols
+
+    @property
+    def bytes_parsed(self):
+        """The number of bytes parsed so far in the current pass."""
+        return self.parser.bytes_parsed
+
+    @property
+    def rows(self):
+        """The number of rows parsed so far in the current pass."""
+        return self.parser.row
+
+    def parse(self, bytes path, long long start, long long end):
+        """Parses the byte range [start, end) of the file at given path."""
+        cdef char* c_path = path
+        cdef int result
+        with nogil:
+            result = parse_svmrank_file_range(&self.parser, c_path, start, end)
+        return result
+
+    def parse_buffer(self, const unsigned char[::1] buffer, size_t start,
+                     size_t end):
+        """Parses the byte range [start, end) of given buffer in place."""
+        cdef const char* c_buffer = NULL
+        cdef size_t slice_end
+        cdef int result = PARSE_OK
+        if buffer.shape[0] > 0:
+            c_buffer = <const char*> &buffer[0]
+        with nogil:
+            # Parse in slices so that progress can be observed meanwhile
+            while start < end and result == PARSE_OK:
+                slice_end = min(start + _PROGRESS_SLICE_SIZE, end)
+                result = parse_svmrank_buffer(
+                    &self.parser, c_buffer + start, slice_end - start)
+                start = slice_end
+            if result == PARSE_OK:
+                result = finish_svmrank_parser(&self.parser)
+        return result
+
+    def parse_stream(self, f, size_t chunk_size):
+        """Parses the binary file object f from its current position to its
+        end, reading `chunk_size` bytes at a time."""
+        cdef const unsigned char[::1] buffer
+        cdef int result = PARSE_OK
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            buffer = chunk
+            with nogil:
+                result = parse_svmrank_buffer(
+                    &self.parser, <const char*> &buffer[0], buffer.shape[0])
+            if result != PARSE_OK:
+                return result
+        return finish_svmrank_parser(&self.parser)
+
+
+cdef class _SVMRankStream:
+    """Streaming parser state that decodes rows into growable buffers."""
+    cdef svmrank_parser parser
+    cdef object dtype
+
+    def __cinit__(self, dtype, unsigned long min_col, unsigned long nr_cols):
+        self.dtype = np.dtype(dtype)
+        if init_svmrank_stream(&self.parser, _DTYPES[self.dtype], min_col,
+                               nr_cols) != PARSE_OK:
+            free_svmrank_stream(&self.parser)
+            raise MemoryError()
+
+    def __dealloc__(self):
+        free_svmrank_stream(&self.parser)
+
+    def feed(self, const unsigned char[::1] buffer):
+        """Parses the next piece of input."""
+        cdef const char* c_buffer = <const char*> &buffer[0]
+        cdef size_t size = buffer.shape[0]
+        cdef int result
+        with nogil:
+            result = parse_svmrank_buffer(&self.parser, c_buffer, size)
+        return result
+
+    def finish(self):
+        """Finishes parsing after all input has been fed."""
+        return finish_svmrank_parser(&self.parser)
+
+    @property
+    def rows(self):
+        """The number of rows in the buffers, the last of which may still be
+        incomplete."""
+        return self.parser.row
+
+    def qids(self):
+        """Returns a view on the qids of the rows in the buffers."""
+        return _as_array(self.parser.qids, (self.parser.row,), np.dtype("l"))
+
+    def take(self, size_t start, size_t end):
+        """Returns a copy of the features and relevance labels of the rows in
+        [start, end) of the buffers."""
+        xs = _as_array(self.parser.xs, (self.parser.row, self.parser.xs_cols),
+                       self.dtype)
+        ys = _as_array(self.parser.ys, (self.parser.row,), np.intc)
+        return xs[start:end].copy(), ys[start:end].copy()
+
+    def consume(self, unsigned long rows):
+        """Removes the first given number of rows from the buffers."""
+        consume_svmrank_stream(&self.parser, rows)
+
+
+def _chunk_boundaries(size, num_chunks, next_line):
+    """Splits `size` bytes of input into at most `num_chunks` byte ranges
+    that start at the beginning of a line. `next_line(pos)` should return the
+    offset of the first line that starts after byte `pos`."""
+    boundaries = [0]
+    for i in range(1, num_chunks):
+        boundary = next_line(max(size * i // num_chunks - 1, boundaries[-1]))
+        if boundary >= size:
+            break
+        if boundary > boundaries[-1]:
+            boundaries.append(boundary)
+    boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def _file_chunk_boundaries(path, num_chunks):
+    """Splits the file at given path into line-aligned byte ranges."""
+    with open(path, "rb") as f:
+        def next_line(pos):
+            f.seek(pos)
+            f.readline()
+            return f.tell()
+        return _chunk_boundaries(os.path.getsize(path), num_chunks, next_line)
+
+
+def _mmap_chunk_boundaries(mapped, num_chunks):
+    """Splits the memory-mapped file into line-aligned byte ranges."""
+    def next_line(pos):
+        pos = mapped.find(b"\n", pos)
+        return len(mapped) if pos == -1 else pos + 1
+    return _chunk_boundaries(len(mapped), num_chunks, next_line)
+
+
+def _buffer_chunk_boundaries(view, num_chunks):
+    """Splits the bytes of given memoryview into line-aligned byte ranges.
+    Only the bytes around each boundary are copied to search for a newline."""
+    def next_line(pos):
+        while pos < len(view):
+            found = bytes(view[pos:pos + 4096]).find(b"\n")
+            if found != -1:
+                return pos + found + 1
+            pos += 4096
+        return len(view)
+    return _chunk_boundaries(len(view), num_chunks, next_line)
+
+
+def _open_mmap(path):
+    """Memory-maps the file at given path for sequential reading. Returns None
+    if the file cannot be memory-mapped (e.g. because it is empty)."""
+    with open(path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None
+    if hasattr(mapped, "madvise"):
+        mapped.madvise(mmap.MADV_SEQUENTIAL)
+    return mapped
+
+
+_COMPRESSED_FORMATS = [
+    (b"\x1f\x8b", gzip.open),
+    (b"BZh", bz2.open),
+    (b"\xfd7zXZ\x00", lzma.open),
+]
+
+
+def _compressed_opener(path):
+    """Returns a function that opens the file at given path for reading
+    decompressed bytes if it is gzip, bz2 or xz compressed, or None if the
+    file is not compressed."""
+    with open(path, "rb") as f:
+        magic = f.read(6)
+    for prefix, open_fn in _COMPRESSED_FORMATS:
+        if magic.startswith(prefix):
+            return lambda: open_fn(path, "rb")
+    return None
+
+
+def _input_name(source):
+    """Returns a name for the input to parse for use in messages."""
+    if isinstance(source, str):
+        return source
+    return getattr(source, "name", "<%s>" % type(source).__name__)
+
+
+def _open_input(source, num_threads, use_mmap, chunk_size):
+    """Sets up the chunks of given input to parse.
+
+    Returns a tuple (ranges, parse_fn, total, mapped) of the input ranges to
+    parse, a function `parse_fn(chunk, range)` that parses a range into a
+    chunk, the total number of bytes (None if unknown) and the memory-mapped
+    file that should be closed after parsing (or None).
+    """
+    if hasattr(source, "read"):
+        seekable = getattr(source, "seekable", None)
+        if seekable is None or not seekable():
+            # Both passes need the input, so read it into memory once
+            source = source.read()
+        else:
+            start = source.tell()
+
+            def parse_stream(chunk, r):
+                source.seek(start)
+                return chunk.parse_stream(source, chunk_size)
+            return [None], parse_stream, None, None
+
+    if not isinstance(source, str):
+        view = memoryview(source).cast("B")
+        ranges = _buffer_chunk_boundaries(view, max(num_threads, 1))
+        return ranges, lambda c, r: c.parse_buffer(view, *r), len(view), None
+
+    opener = _compressed_opener(source)
+    if opener is not None:
+        def parse_compressed(chunk, r):
+            with opener() as f:
+                return chunk.parse_stream(f, chunk_size)
+        return [None], parse_compressed, None, None
+
+    mapped = _open_mmap(source) if use_mmap else None
+    if mapped is not None:
+        ranges = _mmap_chunk_boundaries(mapped, max(num_threads, 1))
+        parse_fn = lambda c, r: c.parse_buffer(mapped, *r)
+        return ranges, parse_fn, len(mapped), mapped
+
+    if num_threads > 1:
+        ranges = _file_chunk_boundaries(source, num_threads)
+    else:
+        ranges = [(0, -1)]
+    path_bytes = source.encode('UTF-8')
+    parse_fn = lambda c, r: c.parse(path_bytes, *r)
+    return ranges, parse_fn, os.path.getsize(source), None
+
+
+def _column_map(columns):
+    """Returns a map from each column index in the file to its column in the
+    output, or to -1 if the column is not selected."""
+    columns = np.asarray(columns, dtype=np.int64)
+    if columns.ndim != 1 or np.any(columns < 0):
+        raise ValueError("columns should be a sequence of column indices")
+    if len(np.unique(columns)) != len(columns):
+        raise ValueError("columns should not contain duplicates")
+    col_map = np.full(columns.max() + 1 if len(columns) > 0 else 1, -1,
+                      dtype=np.intc)
+    col_map[columns] = np.arange(len(columns), dtype=np.intc)
+    return col_map
+
+
+class _ProgressMonitor:
+    """Reports the progress of chunks that are parsed in other threads (or
+    without the GIL) to a progress function, polling every `interval`
+    seconds."""
+
+    def __init__(self, progress_fn, chunks, total, stage, interval=0.1):
+        self.progress_fn = progress_fn
+        self.chunks = chunks
+        self.total = total
+        self.stage = stage
+        self.interval = interval
+        self.start = time.time()
+        self.done = threading.Event()
+        self.thread = None
+
+    def __enter__(self):
+        if self.progress_fn is not None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.done.set()
+        if self.thread is not None:
+            self.thread.join()
+            if exc_type is None:
+                self.report(True)
+
+    @property
+    def seconds(self):
+        return time.time() - self.start
+
+    def _run(self):
+        while not self.done.wait(self.interval):
+            self.report(False)
+
+    def report(self, final):
+        """Reports the bytes and rows parsed so far."""
+        self.progress_fn(sum(chunk.bytes_parsed for chunk in self.chunks),
+                         self.total, final, stage=self.stage,
+                         rows=sum(chunk.rows for chunk in self.chunks),
+                         seconds=self.seconds)
+
+
+def _parse_chunks(chunks, ranges, parse_fn):
+    """Parses each chunk, concurrently if there are multiple chunks, and
+    returns the parse result codes."""
+    if len(chunks) > 1:
+        with ThreadPoolExecutor(len(chunks)) as executor:
+            return list(executor.map(parse_fn, chunks, ranges))
+    return [parse_fn(chunks[0], ranges[0])]
+
+
+_DTYPES = {
+    np.dtype(np.float64): DTYPE_FLOAT64,
+    np.dtype(np.float32): DTYPE_FLOAT32,
+    np.dtype(np.float16): DTYPE_FLOAT16,
+}
+
+
+cdef _as_array(void* data, tuple shape, dtype):
+    """Wraps given C buffer as a numpy array of given shape and dtype. The
+    array does not own the buffer."""
+    dtype = np.dtype(dtype)
+    cdef size_t nbytes = dtype.itemsize
+    for size in shape:
+        nbytes *= size
+    if nbytes == 0:
+        return np.zeros(shape, dtype=dtype)
+    cdef unsigned char[:] view = <unsigned char[:nbytes]> data
+    return np.asarray(view).view(dtype).reshape(shape)
+
+
+cdef _take_array(void** data, tuple shape, dtype):
+    """Wraps the malloc'ed C buffer at *data as a numpy array of given shape
+    and dtype without copying and transfers ownership of the buffer to it.
+    The buffer is freed once the array and all views on it (e.g. torch
+    tensors) are released. Sets *data to NULL."""
+    dtype = np.dtype(dtype)
+    cdef size_t nbytes = dtype.itemsize
+    for size in shape:
+        nbytes *= size
+    cdef void* buffer = data[0]
+    data[0] = NULL
+    if nbytes == 0:
+        free(buffer)
+        return np.zeros(shape, dtype=dtype)
+    cdef view.array owner = <unsigned char[:nbytes]> buffer
+    owner.callback_free_data = free
+    return np.asarray(owner).view(dtype).reshape(shape)
+
+
+def _raise_parse_error(result, path):
+    global errno
+    if result == PARSE_FILE_ERROR:
         raise OSError(errno, "could not open file %s" % path)
     elif result == PARSE_FORMAT_ERROR:
         raise ValueError("could not parse file %s, not in SVMrank format" % path)
     elif result == PARSE_MEMORY_ERROR:
         raise OSError(errno, "could not allocate memory")
+
+
+def _log_parse_stats(path, nr_bytes, rows, nnz, chunks, count_seconds,
+                     fill_seconds):
+    """Logs the statistics of a parse, which are also attached to the log
+    record as `svmrank_parse_stats` for structured log handlers."""
+    seconds = count_seconds + fill_seconds
+    stats = {
+        "path": path,
+        "bytes": nr_bytes,
+        "rows": rows,
+        "nnz": nnz,
+        "chunks": chunks,
+        "count_seconds": count_seconds,
+        "fill_seconds": fill_seconds,
+        "mb_per_second": nr_bytes / 1e6 / seconds if seconds > 0 else 0.0,
+    }
+    logging.info("parsed %(path)s: %(rows)d rows, %(bytes)d bytes in "
+                 "%(count_seconds).2fs (count) + %(fill_seconds).2fs (fill), "
+                 "%(mb_per_second).1f MB/s", stats,
+                 extra={"svmrank_parse_stats": stats})
+
+
+def iter_svmrank_file(path, dtype=np.float64, chunk_size=1 << 20):
+    """Parses the SVMrank file at given path one query at a time.
+
+    Only a bounded buffer of rows is kept in memory: the next chunk of the
+    file and the rows of the queries it contains. The file is read twice, a
+    first pass determines the range of columns so that every query has the
+    same number of features as :func:`parse_svmrank_file` would produce.
+    Files that are gzip, bz2 or xz compressed are decompressed on the fly.
+
+    Args:
+        path: The path of the file to parse.
+        dtype: The dtype of the features (float64, float32 or float16).
+        chunk_size: The number of bytes to read from the file at a time.
+
+    Returns:
+        A generator that yields a tuple (xs, ys, qid) of the features,
+        relevance labels and qid for each block of consecutive rows with the
+        same qid.
+    """
+    if np.dtype(dtype) not in _DTYPES:
+        raise ValueError("unsupported dtype %s" % str(dtype))
+
+    # Count pass to determine the range of columns
+    opener = _compressed_opener(path)
+    counter = _SVMRankChunk()
+    if opener is not None:
+        with opener() as f:
+            result = counter.parse_stream(f, chunk_size)
+    else:
+        result = counter.parse(path.encode('UTF-8'), 0, -1)
+        opener = lambda: open(path, "rb")
+    if result != PARSE_OK:
+        _raise_parse_error(result, path)
+    min_col, nr_cols = counter.column_range()
+
+    # Stream pass, yielding each query once the next query has started
+    stream = _SVMRankStream(dtype, min_col, nr_cols)
+    with opener() as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            result = stream.feed(chunk)
+            if result != PARSE_OK:
+                _raise_parse_error(result, path)
+
+            # All but the last row are complete, the rows of the last query
+            # among those are kept until the query is complete.
+            qids = stream.qids()[:-1]
+            starts = np.flatnonzero(qids[1:] != qids[:-1]) + 1
+            if len(starts) > 0:
+                yield from _take_queries(stream, qids, starts)
+                stream.consume(starts[-1])
+
+    # Yield all remaining queries
+    result = stream.finish()
+    if result != PARSE_OK:
+        _raise_parse_error(result, path)
+    qids = stream.qids()
+    if len(qids) > 0:
+        starts = np.flatnonzero(qids[1:] != qids[:-1]) + 1
+        yield from _take_queries(stream, qids, np.append(starts, len(qids)))
+
+
+def _take_queries(stream, qids, ends):
+    """Yields the queries ending at given row offsets in the stream."""
+    start = 0
+    for end in ends:
+        xs, ys = stream.take(start, end)
+        yield xs, ys, int(qids[start])
+        start = end
+
+
+def parse_svmrank_file(path, num_threads=1, use_mmap=True, dtype=np.float64,
+                       sparse=False, chunk_size=1 << 20, columns=None,
+                       comments=False, progress_fn=None):
+    """Parses the SVMrank file at given path into a dense feature matrix or
+    into CSR arrays.
+
+    Files that are gzip, bz2 or xz compressed are decompressed on the fly and
+    fed to the parser one chunk at a time, without writing the decompressed
+    file to disk. Compressed files are read twice and always parsed by a
+    single thread since they cannot be split at arbitrary offsets.
+
+    Instead of a path, the input may also be an object that supports the
+    buffer protocol (e.g. bytes, bytearray or memoryview), which is parsed in
+    place without copying, or a binary file object such as a member opened
+    from a :obj:`zipfile.ZipFile`. A seekable file object is read twice from
+    its current position, a non-seekable one is read into memory once.
+
+    Args:
+        path: The path of the file to parse, a buffer or a binary file
+            object.
+        num_threads: The number of threads to parse with. When larger than 1,
+            the file is split at line boundaries into chunks that are parsed
+            concurrently and merged in file order.
+        use_mmap: Whether to memory-map the file and parse the mapped pages
+            directly instead of reading it through a buffer.
+        dtype: The dtype of the feature matrix (float64, float32 or
+            float16). Values are decoded directly into this dtype.
+        sparse: Whether to return the features in CSR format instead of as a
+            dense matrix.
+        chunk_size: The number of decompressed bytes to parse at a time when
+            the file is compressed.
+        columns: (Optional) the column indices, as they appear in the file,
+            of the features to keep. Column i of the output holds the feature
+            with index columns[i]. Values of other features are skipped
+            while parsing. By default, all columns from the smallest to the
+            largest column index that occurs in the file are kept.
+        comments: Whether to also return the comment that follows the '#' on
+            each row (e.g. a docid).
+        progress_fn: (Optional) a progress hook, such as a
+            :obj:`pytorchltr.utils.progress.IntervalProgress`, that is called
+            with the bytes parsed so far, the total number of bytes (None if
+            the file is compressed) and whether the pass is finished. It also
+            receives the keyword arguments `stage` ("count" or "fill"),
+            `rows` and `seconds` for the pass in progress.
+
+    Returns:
+        A tuple (xs, ys, qids) of the features, relevance labels and qids. If
+        sparse is True, xs is a tuple ((data, indices, indptr), shape) as
+        accepted by :obj:`scipy.sparse.csr_matrix`. If comments is True, a
+        tuple (data, offsets) is appended, where the comment of row i is
+        data[offsets[i]:offsets[i + 1]] as raw bytes.
+    """
+    # Initialize output
+    cdef svmrank_output out
+    if np.dtype(dtype) not in _DTYPES:
+        raise ValueError("unsupported dtype %s" % str(dtype))
+    memset(&out, 0, sizeof(svmrank_output))
+    out.dtype = _DTYPES[np.dtype(dtype)]
+    out.csr = 1 if sparse else 0
+    out.capture_comments = 1 if comments else 0
+    col_map = _column_map(columns) if columns is not None else None
+
+    # Set up the chunks of the input to parse
+    # os.PathLike and os.fspath only exist from Python 3.6 on. Bytes are
+    # parsed as the contents of a file, so bytes paths are decoded.
+    if hasattr(os, "fspath") and not isinstance(path, (str, bytes)) and \
+            hasattr(path, "__fspath__"):
+        path = os.fsdecode(os.fspath(path))
+    name = _input_name(path)
+    cdef int result = 0
+    ranges, parse_fn, total, mapped = _open_input(
+        path, num_threads, use_mmap, chunk_size)
+    chunks = [_SVMRankChunk() for _ in ranges]
+    cdef size_t nr_chunks = len(chunks)
+    cdef svmrank_parser** parsers = <svmrank_parser**> malloc(
+        nr_chunks * sizeof(svmrank_parser*))
+    if parsers == NULL:
+        _raise_parse_error(PARSE_MEMORY_ERROR, name)
+    for i, chunk in enumerate(chunks):
+        parsers[i] = &(<_SVMRankChunk> chunk).parser
+        if col_map is not None:
+            chunk.select_columns(col_map)
+
+    try:
+        # Count pass: validate the input and count rows and columns
+        with _ProgressMonitor(progress_fn, chunks, total, "count") as count:
+            results = _parse_chunks(chunks, ranges, parse_fn)
+            for result in results:
+                if result != PARSE_OK:
+                    _raise_parse_error(result, name)
+        nr_bytes = sum(chunk.bytes_parsed for chunk in chunks)
+        count_seconds = count.seconds
+
+        # Allocate the output once and decode values directly into it
+        with nogil:
+            result = prepare_svmrank_fill(parsers, nr_chunks, &out)
+        if result != PARSE_OK:
+            _raise_parse_error(result, name)
+        with _ProgressMonitor(progress_fn, chunks, total, "fill") as fill:
+            results = _parse_chunks(chunks, ranges, parse_fn)
+            for result in results:
+                if result != PARSE_OK:
+                    _raise_parse_error(result, name)
+        fill_seconds = fill.seconds
+
+        xs_shape = (out.xs_shape.rows, out.xs_shape.cols)
+        _log_parse_stats(name, nr_bytes, xs_shape[0], out.nnz, len(chunks),
+                         count_seconds, fill_seconds)
+        # Hand the output buffers over to numpy, which frees them once
+        # released
+        ys_np = _take_array(<void**> &out.ys, (xs_shape[0],), np.intc)
+        qids_np = _take_array(<void**> &out.qids, (xs_shape[0],),
+                              np.dtype("l"))
+        if sparse:
+            data = _take_array(&out.xs, (out.nnz,), dtype)
+            indices = _take_array(<void**> &out.indices, (out.nnz,), np.intc)
+            indptr = _take_array(<void**> &out.indptr,
+                                 (xs_shape[0] + 1,), np.longlong)
+            xs_np = ((data, indices, indptr), xs_shape)
+        else:
+            xs_np = _take_array(&out.xs, xs_shape, dtype)
+
+        if comments:
+            offsets = _take_array(<void**> &out.comment_offsets,
+                                  (xs_shape[0] + 1,), np.longlong)
+            data = _take_array(<void**> &out.comments, (offsets[-1],),
+                               np.uint8)
+            return xs_np, ys_np, qids_np, (data, offsets)
+        return xs_np, ys_np, qids_np
+    finally:
+        # Free whatever was not handed over to numpy, also if parsing failed
+        free(parsers)
+        free_svmrank_output(&out)
+        if mapped is not None:
+            mapped.close()
+
+
+ctypedef fused _floating:
+    float
+    double
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def normalize_queries(_floating[:, ::1] xs, offsets):
+    """Performs in-place min-max feature normalization per query.
+
+    The features of query i are the rows xs[offsets[i]:offsets[i + 1]]. Each
+    feature is shifted by its minimum within the query and divided by its
+    maximum after the shift, unless that maximum is 0. For finite features,
+    the results are identical to doing the same with numpy on each query
+    separately.
+
+    Args:
+        xs: A C-contiguous float32 or float64 feature matrix.
+        offsets: The row offsets of the queries.
+    """
+    cdef const long long[::1] c_offsets = np.ascontiguousarray(
+        offsets, dtype=np.longlong)
+    cdef Py_ssize_t nr_queries = c_offsets.shape[0] - 1
+    cdef Py_ssize_t nr_cols = xs.shape[1]
+    cdef Py_ssize_t query, row, col
+    cdef long long start, end
+    cdef _floating* values
+    cdef _floating* low = <_floating*> malloc(
+        max(nr_cols, 1) * sizeof(_floating))
+    cdef _floating* high = <_floating*> malloc(
+        max(nr_cols, 1) * sizeof(_floating))
+    if low == NULL or high == NULL:
+        free(low)
+        free(high)
+        raise MemoryError()
+    if nr_queries > 0 and (c_offsets[0] < 0 or
+                           c_offsets[nr_queries] > xs.shape[0]):
+        free(low)
+        free(high)
+        raise ValueError("query offsets out of range")
+
+    with nogil:
+        for query in range(nr_queries):
+            start = c_offsets[query]
+            end = c_offsets[query + 1]
+            if start >= end:
+                continue
+
+            # Minimum and maximum of each feature within the query
+            values = &xs[start, 0]
+            for col in range(nr_cols):
+                low[col] = values[col]
+                high[col] = values[col]
+            for row in range(start + 1, end):
+                values = &xs[row, 0]
+                for col in range(nr_cols):
+                    low[col] = values[col] if values[col] < low[col] \
+                        else low[col]
+                    high[col] = values[col] if values[col] > high[col] \
+                        else high[col]
+
+            # Rounding is monotonic, so the maximum of the shifted values is
+            # the shifted maximum.
+            for col in range(nr_cols):
+                high[col] = high[col] - low[col]
+                if high[col] == 0:
+                    high[col] = 1
+            for row in range(start, end):
+                values = &xs[row, 0]
+                for col in range(nr_cols):
+                    values[col] = (values[col] - low[col]) / high[col]
+    free(low)
+    free(high)
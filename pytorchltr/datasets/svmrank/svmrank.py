@@ -1,18 +1,44 @@
 """Data loading for SVMRank-style data sets."""
+import hashlib
+import os
+import re
+import sys
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO
 from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
 from typing import List
 from typing import Optional
+from typing import Sequence
+from typing import Type
 from typing import Union
 
 import numpy as _np
 import torch as _torch
 import logging
 
-from scipy.sparse import coo_matrix as _coo_matrix
-from sklearn.datasets import load_svmlight_file as _load_svmlight_file
+from torch.nn.functional import pad as _pad
+from torch.nn.utils.rnn import pad_sequence as _pad_sequence
 from torch.utils.data import Dataset as _Dataset
+from torch.utils.data import IterableDataset as _IterableDataset
+from torch.utils.data import get_worker_info as _get_worker_info
 from pytorchltr.datasets.list_sampler import ListSampler
+from pytorchltr.datasets.svmrank.cache import cache_key
+from pytorchltr.datasets.svmrank.cache import cache_matches_file
+from pytorchltr.datasets.svmrank.cache import file_stat
+from pytorchltr.datasets.svmrank.cache import load_cache
+from pytorchltr.datasets.svmrank.cache import save_cache
+from pytorchltr.datasets.svmrank.cache import save_file_stat
+from pytorchltr.datasets.svmrank.parser import iter_svmrank_file
+from pytorchltr.datasets.svmrank.parser import normalize_queries
 from pytorchltr.datasets.svmrank.parser import parse_svmrank_file
+from pytorchltr.utils.file import sha256_checksum
+from pytorchltr.utils.progress import LoggingProgress
+from pytorchltr.utils.progress import TerminalProgress
+from pytorchltr.utils.progress import to_human_readable
 
 
 class SVMRankItem:
@@ -40,77 +66,478 @@ class SVMRankBatch:
         self.sparse = sparse
 
 
-_COLLATE_RETURN_TYPE = Callable[[List[SVMRankItem]], SVMRankBatch]
+class SVMRankItems:
+    """Items from a :obj:`pytorchltr.datasets.svmrank.SVMRankDataset` as
+    returned by :meth:`SVMRankDataset.__getitems__`.
+
+    The items are packed as references to the feature and relevance storage
+    of the dataset and the start row, number of documents and qid of each
+    item. Indexing or iterating yields
+    :obj:`pytorchltr.datasets.svmrank.SVMRankItem` views, so that it can be
+    used in place of a list of items.
+    """
+    def __init__(self, features: _torch.Tensor, relevance: _torch.LongTensor,
+                 start: _torch.LongTensor, n: _torch.LongTensor,
+                 qid: _torch.LongTensor, sparse: bool):
+        self.features = features
+        self.relevance = relevance
+        self.start = start
+        self.n = n
+        self.qid = qid
+        self.sparse = sparse
+
+    def __len__(self) -> int:
+        return self.n.shape[0]
+
+    def __getitem__(self, index: int) -> SVMRankItem:
+        start = int(self.start[index])
+        n = int(self.n[index])
+        return SVMRankItem(self.features[start:start + n],
+                           self.relevance[start:start + n], n,
+                           int(self.qid[index]), self.sparse)
+
+    def __iter__(self) -> Iterator[SVMRankItem]:
+        return (self[index] for index in range(len(self)))
+
+
+_COLLATE_RETURN_TYPE = Callable[
+    [Union[List[SVMRankItem], SVMRankItems]], SVMRankBatch]
+_PROGRESS_FN_TYPE = Callable[..., None]
+_DOCID_COMMENT = re.compile(r"docid\s*=\s*(\S+)")
+_SHARED_ARRAYS = ("_offsets", "_unique_qids", "_indices", "_qid_order",
+                  "_sorted_qids", "_comments", "_comment_offsets",
+                  "_xs_indptr")
+
+
+def _normalize_query(xs: _np.ndarray):
+    """Performs in-place feature normalization on the features of a query."""
+    xs -= _np.min(xs, axis=0)
+    m = _np.max(xs, axis=0)
+    m[m == 0.0] = 1.0
+    xs /= m
+
+
+def _normalize_queries(xs: _np.ndarray, offsets: _np.ndarray,
+                       block_size: int = 1 << 14):
+    """Performs in-place feature normalization on the features of every query,
+    where the features of query i are xs[offsets[i]:offsets[i + 1]].
+
+    Contiguous float32 and float64 features are normalized by a compiled
+    kernel without any temporaries. Otherwise, the minimum and maximum of
+    each query are computed with segment reductions, processing queries in
+    blocks of about `block_size` rows so that temporaries stay small.
+    """
+    if xs.dtype in (_np.float32, _np.float64) and xs.flags.c_contiguous:
+        normalize_queries(xs, offsets)
+        return
+    nr_queries = len(offsets) - 1
+    query = 0
+    while query < nr_queries and offsets[query] < offsets[-1]:
+        # Take as many queries as fit in a block, but at least one
+        end = _np.searchsorted(offsets, offsets[query] + block_size,
+                               side="right") - 1
+        end = min(max(end, query + 1), nr_queries)
+        start_row = offsets[query]
+        block = xs[start_row:offsets[end]]
+        starts = offsets[query:end] - start_row
+        counts = _np.diff(offsets[query:end + 1])
+
+        block -= _np.repeat(_np.minimum.reduceat(block, starts, axis=0),
+                            counts, axis=0)
+        m = _np.maximum.reduceat(block, starts, axis=0)
+        m[m == 0.0] = 1.0
+        block /= _np.repeat(m, counts, axis=0)
+        query = end
+
+
+def _cache_path(cache_dir: str, sha256: str, sparse: bool, normalize: bool,
+                dtype: _np.dtype, columns: Optional[List[int]],
+                comments: bool) -> str:
+    """Returns the path of the cache entry for a file and its load
+    options."""
+    options = {"sparse": sparse, "normalize": normalize,
+               "dtype": _np.dtype(dtype).name}
+    if comments:
+        options["comments"] = True
+    if columns is not None:
+        options["columns"] = hashlib.sha256(_np.asarray(
+            columns, dtype=_np.int64).tobytes()).hexdigest()[:16]
+    return os.path.join(cache_dir, cache_key(sha256, **options))
+
+
+def _sparse_indices(indices: _np.ndarray, indptr: _np.ndarray,
+                    offsets: _np.ndarray) -> _np.ndarray:
+    """Returns the (row within the query, column) indices of the nonzeros of
+    a CSR matrix whose rows are the documents of queries starting at given
+    offsets, as a (2, nnz) array."""
+    nr_rows = len(indptr) - 1
+    query_rows = _np.arange(nr_rows) - _np.repeat(offsets[:-1],
+                                                  _np.diff(offsets))
+    out = _np.empty((2, len(indices)), dtype=_np.int64)
+    out[0] = _np.repeat(query_rows, _np.diff(indptr))
+    out[1] = indices
+    return out
+
+
+def _list_size(list_sampler: ListSampler, n: _torch.LongTensor,
+               relevance: Iterable[_torch.LongTensor]) -> int:
+    """Returns the list size of a batch of lists with given numbers of
+    documents and relevance labels, the largest max list size among them."""
+    if len(n) == 0:
+        return 0
+    return int(list_sampler.max_list_sizes(n, relevance).max())
+
+
+def _collate_items(items: SVMRankItems,
+                   list_sampler: ListSampler) -> SVMRankBatch:
+    """Collates packed dense items into a batch with a single gather from
+    the storage of the dataset."""
+    list_size = _list_size(list_sampler, items.n,
+                           (item.relevance for item in items))
+    sizes = items.n.clamp(max=list_size)
+
+    # Map every document of the batch to its storage row and to its index in
+    # the flattened (batch, list) output.
+    n = items.n.numpy()
+    start = items.start.numpy()
+    ends = _np.cumsum(n)
+    batch = _np.repeat(_np.arange(len(n)), n)
+    position = _np.arange(ends[-1] if len(n) > 0 else 0) - \
+        _np.repeat(ends - n, n)
+    rows = _np.repeat(start, n) + position
+    targets = batch * list_size + position
+
+    # Lists that exceed the list size are sampled one by one.
+    sampled = _np.flatnonzero(n > list_size)
+    if len(sampled) > 0:
+        keep = n[batch] <= list_size
+        rows, targets = [rows[keep]], [targets[keep]]
+        for index in sampled:
+            indices = list_sampler(items.relevance[
+                start[index]:start[index] + n[index]]).numpy()
+            rows.append(indices + start[index])
+            targets.append(_np.arange(len(indices)) + index * list_size)
+        rows = _np.concatenate(rows)
+        targets = _np.concatenate(targets)
+
+    # Gather every entry of the flattened output at once. Padding entries
+    # gather the first row and are zeroed afterwards.
+    index_map = _np.zeros(len(items) * list_size, dtype=_np.int64)
+    index_map[targets] = rows
+    padding = _np.ones(len(index_map), dtype=_np.bool_)
+    padding[targets] = False
+    index_map = _torch.from_numpy(index_map)
+    padding = _torch.from_numpy(_np.flatnonzero(padding))
+
+    nr_features = items.features.shape[1]
+    out_features = items.features.index_select(0, index_map)
+    out_features.index_fill_(0, padding, 0)
+    out_features = out_features.view(len(items), list_size, nr_features)
+    out_relevance = items.relevance.index_select(0, index_map)
+    out_relevance.index_fill_(0, padding, 0)
+    out_relevance = out_relevance.view(len(items), list_size)
+    return SVMRankBatch(out_features, out_relevance, sizes, items.qid.clone(),
+                        False)
+
+
+def _collate_sparse(batch: List[SVMRankItem],
+                    list_sampler: ListSampler) -> SVMRankBatch:
+    """Collates sparse items into a batch by remapping the rows of all
+    nonzeros at once and concatenating them into a single sparse tensor."""
+    n = _torch.tensor([sample.n for sample in batch], dtype=_torch.long)
+    list_size = _list_size(list_sampler, n,
+                           (sample.relevance for sample in batch))
+    sizes = n.clamp(max=list_size)
+    nr_features = batch[0].features.shape[1] if len(batch) > 0 else 0
+
+    # Map every document of the batch to its row in the output list, or to -1
+    # if it is not sampled. Document j of item i is document offsets[i] + j.
+    offsets = _torch.zeros(len(batch) + 1, dtype=_torch.long)
+    _torch.cumsum(n, 0, out=offsets[1:])
+    remap = _torch.arange(int(offsets[-1])) - \
+        _torch.repeat_interleave(offsets[:-1], n)
+    for index in _torch.nonzero(n > list_size).flatten().tolist():
+        indices = list_sampler(batch[index].relevance)
+        start = int(offsets[index])
+        remap[start:start + int(n[index])] = -1
+        remap[start + indices] = _torch.arange(len(indices))
+
+    # Remap the rows of all nonzeros with a single gather.
+    ind = [sample.features._indices() for sample in batch]
+    counts = _torch.tensor([i.shape[1] for i in ind], dtype=_torch.long)
+    ind = _torch.cat(ind, dim=1)
+    val = _torch.cat([sample.features._values() for sample in batch])
+    nz_batch = _torch.repeat_interleave(_torch.arange(len(batch)), counts)
+    nz_rows = remap[offsets[:-1][nz_batch] + ind[0]]
+    keep = nz_rows >= 0
+    out_features = _torch.sparse_coo_tensor(
+        _torch.stack([nz_batch[keep], nz_rows[keep], ind[1][keep]]),
+        val[keep], (len(batch), list_size, nr_features))
+
+    # Scatter the relevance labels of the sampled documents.
+    doc_batch = _torch.repeat_interleave(_torch.arange(len(batch)), n)
+    keep = remap >= 0
+    out_relevance = _torch.zeros((len(batch), list_size), dtype=_torch.long)
+    out_relevance.view(-1).index_copy_(
+        0, doc_batch[keep] * list_size + remap[keep],
+        _torch.cat([sample.relevance for sample in batch])[keep])
+    qid = _torch.tensor([int(sample.qid) for sample in batch],
+                        dtype=_torch.long)
+    return SVMRankBatch(out_features, out_relevance, sizes, qid, True)
 
 
 class SVMRankDataset(_Dataset):
-    def __init__(self, file: str, sparse: bool = False,
-                 normalize: bool = False, filter_queries: bool = False,
-                 zero_based: Union[str, int] = "auto"):
+    def __init__(self, file: Union[str, bytes, memoryview, BinaryIO],
+                 sparse: bool = False, normalize: bool = False,
+                 filter_queries: bool = False,
+                 zero_based: Union[str, int] = "auto", num_threads: int = 1,
+                 dtype: _np.dtype = _np.float32,
+                 cache_dir: Optional[str] = None,
+                 sha256: Optional[str] = None,
+                 columns: Optional[List[int]] = None,
+                 comments: bool = False,
+                 progress_fn: Optional[_PROGRESS_FN_TYPE] = None,
+                 share_memory: bool = False):
         """Creates an SVMRank-style dataset from a file.
 
         Args:
-            file: The path to load the dataset from.
+            file: The path to load the dataset from. This may also be an
+                in-memory buffer (e.g. bytes), which is parsed without
+                copying, or a binary file object, such as a member of a zip
+                archive opened with :meth:`zipfile.ZipFile.open`.
             sparse: Whether to load the features as sparse features.
             normalize: Whether to perform query-level normalization (requires
                 non-sparse features).
             filter_queries: Whether to filter queries that have no relevant
                 documents associated with them.
-            zero_based: The zero based index.
+            zero_based: Deprecated and ignored, column indices are always
+                offset by the smallest column index that occurs in the file.
+                Passing anything other than "auto" warns.
+            num_threads: The number of threads to use when parsing the
+                file.
+            dtype: The dtype to store features in (float64, float32 or
+                float16).
+            cache_dir: (Optional) a directory in which the parsed (and
+                normalized) dataset is cached in a binary format. Later loads
+                of the same file with the same options memory-map the cached
+                arrays instead of parsing the file.
+            sha256: (Optional) the sha256 checksum of the file, used to
+                identify its cache entry. If not given, it is computed from
+                the file when a cache_dir is given, which requires the file
+                to be a path. If given, a cache entry is used without reading
+                the file as long as the file has the size and modification
+                time it had when the entry was created.
+            columns: (Optional) the feature indices, as they appear in the
+                file, of the features to load. Other features are skipped
+                while parsing. By default, all features are loaded.
+            comments: Whether to load the comment that follows the '#' on
+                each line of the file, see :meth:`get_comments` and
+                :meth:`get_docids`.
+            progress_fn: (Optional) a progress hook that reports the
+                progress of parsing the file, such as
+                :obj:`pytorchltr.datasets.svmrank.svmrank.DefaultParseProgress`.
+            share_memory: Whether to move the dataset to shared memory after
+                loading it, see :meth:`share_memory`.
         """
-        logging.info("loading svmrank dataset from %s", file)
+        if normalize and sparse:
+            raise NotImplementedError(
+                "Normalization without dense features is not supported.")
+        if zero_based != "auto":
+            warnings.warn(
+                "zero_based is ignored, column indices are offset by the "
+                "smallest column index in the file", DeprecationWarning,
+                stacklevel=2)
+        self._sparse = sparse
+
+        # Look up the cache entry for this file and options
+        cache_path = None
+        arrays = None
+        if cache_dir is not None:
+            is_path = isinstance(file, str)
+            checked = False
+            if sha256 is None:
+                if not is_path:
+                    raise ValueError(
+                        "a sha256 checksum is required to cache a dataset "
+                        "that is not loaded from a path")
+                sha256 = sha256_checksum(file)
+                checked = True
+            cache_path = _cache_path(cache_dir, sha256, sparse, normalize,
+                                     dtype, columns, comments)
+            arrays = load_cache(cache_path)
+
+            # A cache entry is used without reading the file as long as the
+            # file has not changed since the entry was created. Otherwise,
+            # the contents of the file are checked against its checksum.
+            if arrays is not None:
+                arrays.pop("file_stat", None)
+                if is_path and not checked and \
+                        not cache_matches_file(cache_path, file):
+                    if sha256_checksum(file) == sha256:
+                        save_file_stat(cache_path, file)
+                    else:
+                        logging.warning(
+                            "'%s' does not match its checksum, ignoring its "
+                            "cache entry", file)
+                        arrays = None
+                        cache_path = None
+
+        if arrays is None:
+            stat = file_stat(file) if isinstance(file, str) else None
+            arrays = self._load(file, sparse, normalize, num_threads, dtype,
+                                columns, comments, progress_fn)
+            if cache_path is not None:
+                entry = arrays if stat is None else dict(arrays,
+                                                         file_stat=stat)
+                save_cache(cache_path, entry)
 
-        # Load svmlight file
         if not sparse:
-            # Use faster cython dense parser
-            self._xs, self._ys, qids = parse_svmrank_file(file)
+            self._xs = arrays["xs"]
+        self._ys = arrays["ys"]
+        self._offsets = arrays["offsets"]
+        self._unique_qids = arrays["unique_qids"]
+        self._comments = arrays.get("comments")
+        self._comment_offsets = arrays.get("comment_offsets")
+
+        # Filter queries without any relevant documents
+        if filter_queries:
+            relevance = _np.add.reduceat(self._ys, self._offsets[:-1],
+                                         dtype=_np.int64)
+            self._indices = _np.flatnonzero(relevance > 0)
+        else:
+            self._indices = _np.arange(len(self._unique_qids))
+
+        # Index qids by a sorted array of qids and their dataset indices
+        qids = self._unique_qids[self._indices]
+        self._qid_order = _np.argsort(qids, kind="stable")
+        self._sorted_qids = qids[self._qid_order]
+        self._n = len(self._indices)
+
+        # Hold features and relevance labels as torch tensors, so that items
+        # are views on them. The features share memory with the parsed (or
+        # memory-mapped) array, only the labels are converted to int64. Sparse
+        # features are held as their nonzero values, the (row within the
+        # query, column) indices of the nonzeros and the CSR row pointers.
+        if sparse:
+            self._xs = _torch.from_numpy(arrays["data"])
+            self._xs_indptr = arrays["indptr"].astype(_np.int64)
+            self._xs_indices = _torch.from_numpy(_sparse_indices(
+                arrays["indices"], self._xs_indptr, self._offsets))
+            self._nr_features = int(arrays["shape"][1])
         else:
-            # Use sklearn's sparse-support parser
-            self._xs, self._ys, qids = _load_svmlight_file(
-                file, query_id=True, zero_based=zero_based)
+            self._xs = _torch.from_numpy(self._xs)
+            self._xs_indptr = None
+            self._xs_indices = None
+        self._ys = _torch.from_numpy(self._ys.astype(_np.int64))
+
+        # Arrays that have been moved to shared memory, by attribute name
+        self._shared = {}
+        if share_memory:
+            self.share_memory()
+
+    @staticmethod
+    def is_cached(file: str, cache_dir: str, sha256: str,
+                  sparse: bool = False, normalize: bool = False,
+                  dtype: _np.dtype = _np.float32,
+                  columns: Optional[List[int]] = None,
+                  comments: bool = False) -> bool:
+        """Returns whether loading the dataset with given options is served
+        from an up to date cache entry, without reading the file.
+
+        Args:
+            file: The path of the dataset file.
+            cache_dir: The cache directory.
+            sha256: The sha256 checksum of the file.
+            sparse: Whether to load sparse features.
+            normalize: Whether to normalize the features.
+            dtype: The dtype to store features in.
+            columns: (Optional) the feature indices of the features to load.
+            comments: Whether to load comments.
+
+        Returns:
+            True if a cache entry exists that was created from (or checked
+            against) the file as it is now.
+        """
+        return cache_matches_file(_cache_path(
+            cache_dir, sha256, sparse, normalize, dtype, columns, comments),
+            file)
+
+    def _load(self, file, sparse, normalize, num_threads, dtype, columns,
+              comments, progress_fn):
+        """Parses (and normalizes) the dataset file into a dict of arrays."""
+        if isinstance(file, str):
+            name = file
+        else:
+            name = getattr(file, "name", "<%s>" % type(file).__name__)
+        logging.info("loading svmrank dataset from %s", name)
+
+        # Load svmlight file
+        xs, self._ys, qids, *rest = parse_svmrank_file(
+            file, num_threads=num_threads, dtype=dtype, sparse=sparse,
+            columns=columns, comments=comments, progress_fn=progress_fn)
+        arrays = {}
+        if comments:
+            arrays["comments"], arrays["comment_offsets"] = rest[0]
 
         # Compute query offsets and unique qids
         self._offsets = _np.hstack(
             [[0], _np.where(qids[1:] != qids[:-1])[0] + 1, [len(qids)]])
-        self._unique_qids = qids[self._offsets[:-1]]
-
-        # Densify
-        self._sparse = sparse
-        # if not sparse:
-        #     self._xs = self._xs.A
+        unique_qids = qids[self._offsets[:-1]]
 
         # Normalize xs
+        arrays.update({"ys": self._ys, "offsets": self._offsets,
+                       "unique_qids": unique_qids})
+        if sparse:
+            (data, indices, indptr), shape = xs
+            arrays.update({"data": data, "indices": indices,
+                           "indptr": indptr, "shape": _np.array(shape)})
+            return arrays
+        self._xs = xs
         if normalize:
-            if sparse:
-                raise NotImplementedError(
-                    "Normalization without dense features is not supported.")
             self._normalize()
-
-        # Filter queries without any relevant documents
-        if filter_queries:
-            indices = []
-            for i, (start, end) in enumerate(zip(self._offsets[:-1],
-                                                 self._offsets[1:])):
-                if _np.sum(self._ys[start:end]) > 0.0:
-                    indices.append(i)
-            self._indices = _np.array(indices)
-        else:
-            self._indices = _np.arange(len(self._unique_qids))
-
-        # Compute qid map and dataset length
-        self._qid_map = {
-            self._unique_qids[self._indices[index]]: index
-            for index in range(len(self._indices))
-        }
-        self._n = len(self._indices)
+        arrays["xs"] = self._xs
+        return arrays
 
     def _normalize(self):
         """Performs query-level feature normalization on the dataset."""
-        for start, end in zip(self._offsets[:-1], self._offsets[1:]):
-            self._xs[start:end, :] -= _np.min(self._xs[start:end, :], axis=0)
-            m = _np.max(self._xs[start:end, :], axis=0)
-            m[m == 0.0] = 1.0
-            self._xs[start:end, :] /= m
+        _normalize_queries(self._xs, self._offsets)
+
+    def share_memory(self) -> "SVMRankDataset":
+        """Moves the storage of the dataset to shared memory.
+
+        The (dense or sparse) features, relevance labels, query offsets and
+        the other arrays of the dataset are copied to shared memory once.
+        Pickling the dataset with :mod:`torch.multiprocessing`, as data loader
+        workers do, then only sends handles to the shared memory, and forked
+        workers never copy it on write. All workers together use about a
+        single copy of the dataset.
+
+        Returns:
+            The dataset itself.
+        """
+        self._xs.share_memory_()
+        self._ys.share_memory_()
+        if self._xs_indices is not None:
+            self._xs_indices.share_memory_()
+        for name in _SHARED_ARRAYS:
+            array = getattr(self, name)
+            if array is not None and name not in self._shared:
+                self._shared[name] = _torch.from_numpy(array).share_memory_()
+                setattr(self, name, self._shared[name].numpy())
+        return self
+
+    def __getstate__(self):
+        # Arrays in shared memory are pickled only as their tensors, which
+        # torch.multiprocessing sends as handles to the shared memory.
+        state = self.__dict__.copy()
+        for name in self._shared:
+            state[name] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for name, tensor in self._shared.items():
+            setattr(self, name, tensor.numpy())
 
     def get_index(self, qid: int) -> int:
         """Returns the dataset item index for given qid (if it exists).
@@ -121,7 +548,79 @@ class SVMRankDataset(_Dataset):
         Returns:
             The corresponding the dataset index for given qid.
         """
-        return self._qid_map[qid]
+        return int(self.get_indices([qid])[0])
+
+    def get_indices(self, qids: Union[List[int], _np.ndarray]) -> _np.ndarray:
+        """Returns the dataset item indices for given qids (if they exist).
+
+        Args:
+            qids: The qids to look up.
+
+        Returns:
+            An array with the corresponding dataset index for each qid.
+        """
+        qids = _np.asarray(qids, dtype=self._sorted_qids.dtype)
+        positions = _np.searchsorted(self._sorted_qids, qids,
+                                     side="right") - 1
+        found = positions >= 0
+        found[found] = self._sorted_qids[positions[found]] == qids[found]
+        if not _np.all(found):
+            raise KeyError(int(qids[~found][0]))
+        return self._qid_order[positions]
+
+    def get_lengths(self) -> _np.ndarray:
+        """Returns the number of documents of every dataset item, for
+        example to group items of similar lengths with a
+        :obj:`pytorchltr.datasets.batch_sampler.BucketBatchSampler`.
+
+        Returns:
+            An array with the number of documents of each dataset index.
+        """
+        return _np.diff(self._offsets)[self._indices]
+
+    def get_comments(self, index: int) -> List[str]:
+        """Returns the comments of the documents of the dataset item at given
+        index, in the same order as the documents of the item.
+
+        Args:
+            index: The dataset index.
+
+        Returns:
+            The comment that follows the '#' on the line of each document, or
+            an empty string for documents without a comment.
+        """
+        if self._comments is None:
+            raise ValueError("dataset was loaded without comments")
+        index = self._indices[index]
+        start, end = self._offsets[index], self._offsets[index + 1]
+        offsets = self._comment_offsets[start:end + 1]
+        data = self._comments[offsets[0]:offsets[-1]].tobytes()
+        offsets = offsets - offsets[0]
+        return [data[offsets[i]:offsets[i + 1]].decode("utf-8").strip()
+                for i in range(end - start)]
+
+    def get_docids(self, index: int) -> List[str]:
+        """Returns the docids of the documents of the dataset item at given
+        index, read from their comments.
+
+        A comment of the form "docid = <docid> ..." (as used by LETOR
+        datasets) yields <docid>, any other comment yields its first word.
+
+        Args:
+            index: The dataset index.
+
+        Returns:
+            The docid of each document, in the same order as the documents of
+            the item.
+        """
+        docids = []
+        for comment in self.get_comments(index):
+            match = _DOCID_COMMENT.match(comment)
+            if match is not None:
+                docids.append(match.group(1))
+            else:
+                docids.append(comment.split(maxsplit=1)[0] if comment else "")
+        return docids
 
     @staticmethod
     def collate_fn(list_sampler: Optional[ListSampler] = None) -> _COLLATE_RETURN_TYPE:  # noqa: E501
@@ -132,77 +631,40 @@ class SVMRankDataset(_Dataset):
         if list_sampler is None:
             list_sampler = ListSampler()
 
-        def _collate_fn(batch: List[SVMRankItem]) -> SVMRankBatch:
-            # Check if batch is sparse or not
-            sparse = batch[0].sparse
-
-            # Compute list size
-            list_size = max([list_sampler.max_list_size(b.relevance)
-                             for b in batch])
-
-            # Create output tensors from batch
-            if sparse:
-                out_features = []
-            else:
-                out_features = _torch.zeros(
-                    (len(batch), list_size, batch[0].features.shape[1]))
-            out_relevance = _torch.zeros(
-                (len(batch), list_size), dtype=_torch.long)
-            out_qid = _torch.zeros(len(batch), dtype=_torch.long)
-            out_n = _torch.zeros(len(batch), dtype=_torch.long)
-
-            # Collate the whole batch
-            for batch_index, sample in enumerate(batch):
-
-                # Generate random indices when we exceed the list_size.
-                xs = sample.features
-                if xs.shape[0] > list_size:
-                    rng_indices = list_sampler(sample.relevance)
-
-                # Collate features
-                if sparse:
-                    xs_coalesce = xs.coalesce()
-                    ind = xs_coalesce.indices()
-                    val = xs_coalesce.values()
-                    if xs.shape[0] > list_size:
-                        mask = [ind[0, :] == i for i in rng_indices]
-                        for i in range(len(mask)):
-                            ind[0, mask[i]] = int(i)
-                        ind = ind[:, sum(mask)]
-                        val = val[sum(mask)]
-                    ind_l = _torch.ones((1, ind.shape[1]),
-                                        dtype=ind.dtype) * batch_index
-                    ind = _torch.cat([ind_l, ind], dim=0)
-                    out_features.append((ind, val))
-                else:
-                    if xs.shape[0] > list_size:
-                        out_features[batch_index, :, :] = xs[rng_indices, :]
-                    else:
-                        out_features[batch_index, 0:xs.shape[0], :] = xs
-
-                # Collate relevance
-                if xs.shape[0] > list_size:
-                    rel = sample.relevance[rng_indices]
-                    rel_n = len(rng_indices)
-                    out_relevance[batch_index, 0:rel_n] = rel
-                else:
-                    rel = sample.relevance
-                    rel_n = len(sample.relevance)
-                    out_relevance[batch_index, 0:rel_n] = rel
-
-                # Collate qid and n
-                out_qid[batch_index] = int(sample.qid)
-                out_n[batch_index] = min(int(sample.n), list_size)
-
-            if sparse:
-                ind = _torch.cat([d[0] for d in out_features], dim=1)
-                val = _torch.cat([d[1] for d in out_features], dim=0)
-                size = (len(batch), list_size, batch[0].features.shape[1])
-                out_features = _torch.sparse.FloatTensor(
-                    ind, val, _torch.Size(size))
-
-            return SVMRankBatch(out_features, out_relevance, out_n, out_qid,
-                                sparse)
+        def _collate_fn(batch: Union[List[SVMRankItem], SVMRankItems]
+                        ) -> SVMRankBatch:
+            # Collate packed items from the storage they refer to
+            if isinstance(batch, SVMRankItems) and not batch.sparse:
+                return _collate_items(batch, list_sampler)
+
+            if batch[0].sparse:
+                return _collate_sparse(batch, list_sampler)
+
+            # Sample the lists that exceed the list size and pad all lists at
+            # once
+            n = _torch.tensor([sample.n for sample in batch],
+                              dtype=_torch.long)
+            relevance = [sample.relevance for sample in batch]
+            list_size = _list_size(list_sampler, n, relevance)
+            sizes = n.clamp(max=list_size)
+            features = [sample.features for sample in batch]
+            for index in _torch.nonzero(n > list_size).flatten().tolist():
+                indices = list_sampler(relevance[index])
+                features[index] = features[index][indices]
+                relevance[index] = relevance[index][indices]
+            out_features = _pad_sequence(features, batch_first=True)
+            out_relevance = _pad_sequence(relevance, batch_first=True).long()
+
+            # Pad up to the list size if the list sampler allows longer lists
+            # than the longest one
+            padding = list_size - out_features.shape[1]
+            if padding > 0:
+                out_features = _pad(out_features, (0, 0, 0, padding))
+                out_relevance = _pad(out_relevance, (0, padding))
+            qid = _torch.tensor([int(sample.qid) for sample in batch],
+                                dtype=_torch.long)
+            return SVMRankBatch(out_features, out_relevance, sizes, qid,
+                                False)
 
         return _collate_fn
 
@@ -219,26 +681,54 @@ class SVMRankDataset(_Dataset):
 
         """
         # Extract query features and relevance labels
-        qid = self._unique_qids[self._indices[index]]
-        start = self._offsets[self._indices[index]]
-        end = self._offsets[self._indices[index] + 1]
-        features = self._xs[start:end, :]
-        y = _torch.LongTensor(self._ys[start:end])
+        index = self._indices[index]
+        qid = self._unique_qids[index]
+        start = int(self._offsets[index])
+        end = int(self._offsets[index + 1])
+        y = self._ys[start:end]
         n = end - start
 
-        # Compute sparse or dense torch tensor
+        # Slice the nonzeros of the query for sparse features
         if self._sparse:
-            coo = _coo_matrix(features)
-            ind = _torch.LongTensor(_np.vstack((coo.row, coo.col)))
-            val = _torch.FloatTensor(coo.data)
-            features = _torch.sparse.FloatTensor(
-                ind, val, _torch.Size(coo.shape))
+            nz_start = int(self._xs_indptr[start])
+            nz_end = int(self._xs_indptr[end])
+            features = _torch.sparse_coo_tensor(
+                self._xs_indices[:, nz_start:nz_end],
+                self._xs[nz_start:nz_end], (n, self._nr_features))
         else:
-            features = _torch.FloatTensor(features)
+            features = self._xs[start:end, :]
 
         # Return data sample
         return SVMRankItem(features, y, n, qid, self._sparse)
 
+    def __getitems__(self, indices: List[int]
+                     ) -> Union[SVMRankItems, List[SVMRankItem]]:
+        r"""
+        Returns the items at given indices, as used by data loaders to fetch
+        a batch at once.
+
+        Args:
+            indices (list of int): The indices.
+
+        Returns:
+            For dense features, a
+            :obj:`pytorchltr.datasets.svmrank.svmrank.SVMRankItems` that
+            refers to the documents of all items in the storage of the
+            dataset, which the collate function gathers in one operation.
+            For sparse features, a list of
+            :obj:`pytorchltr.datasets.svmrank.SVMRankItem`.
+        """
+        if self._sparse:
+            return [self[index] for index in indices]
+        indices = self._indices[_np.asarray(indices, dtype=_np.int64)]
+        start = self._offsets[indices]
+        n = self._offsets[indices + 1] - start
+        return SVMRankItems(
+            self._xs, self._ys, _torch.from_numpy(start.astype(_np.int64)),
+            _torch.from_numpy(n.astype(_np.int64)),
+            _torch.from_numpy(self._unique_qids[indices].astype(_np.int64)),
+            False)
+
     def __len__(self) -> int:
         r"""
         Returns:
@@ -246,3 +736,124 @@ class SVMRankDataset(_Dataset):
                 The length of the dataset.
         """
         return self._n
+
+
+class SVMRankIterableDataset(_IterableDataset):
+    def __init__(self, file: str, normalize: bool = False,
+                 filter_queries: bool = False, dtype: _np.dtype = _np.float32,
+                 chunk_size: int = 1 << 20):
+        """Creates an SVMRank-style dataset that streams queries from a file.
+
+        Unlike :obj:`SVMRankDataset`, the file is never loaded into memory as
+        a whole, which makes this suitable for files that are larger than
+        memory. Items can be collated with :meth:`SVMRankDataset.collate_fn`.
+        When used with multiple data loader workers, each worker parses the
+        file and yields a disjoint subset of the queries.
+
+        Args:
+            file: The path to load the dataset from.
+            normalize: Whether to perform query-level normalization.
+            filter_queries: Whether to filter queries that have no relevant
+                documents associated with them.
+            dtype: The dtype of the features (float64, float32 or float16).
+            chunk_size: The number of bytes to read from the file at a time.
+        """
+        self._file = file
+        self._normalize = normalize
+        self._filter_queries = filter_queries
+        self._dtype = dtype
+        self._chunk_size = chunk_size
+
+    def __iter__(self) -> Iterator[SVMRankItem]:
+        r"""
+        Returns:
+            An iterator over :obj:`pytorchltr.datasets.svmrank.SVMRankItem`
+            for each query in the file.
+        """
+        worker_info = _get_worker_info()
+        queries = iter_svmrank_file(self._file, dtype=self._dtype,
+                                    chunk_size=self._chunk_size)
+        for index, (xs, ys, qid) in enumerate(queries):
+            if worker_info is not None and \
+                    index % worker_info.num_workers != worker_info.id:
+                continue
+            if self._filter_queries and _np.sum(ys) <= 0.0:
+                continue
+            if self._normalize:
+                _normalize_query(xs)
+            yield SVMRankItem(_torch.from_numpy(xs),
+                              _torch.from_numpy(ys.astype(_np.int64)),
+                              xs.shape[0], qid, False)
+
+
+def load_splits(dataset: Type[SVMRankDataset],
+                splits: Sequence[str] = ("train", "vali", "test"),
+                num_workers: Optional[int] = None,
+                **kwargs) -> Dict[str, SVMRankDataset]:
+    """Loads several splits of a dataset concurrently.
+
+    Each split is loaded in its own thread. Since the parser runs without
+    holding the GIL, the files of the splits are parsed in parallel.
+
+    Args:
+        dataset: The dataset class to load the splits of, such as
+            :obj:`pytorchltr.datasets.MSLR10K`.
+        splits: The names of the splits to load.
+        num_workers: (Optional) the maximum number of splits to load at the
+            same time. By default, all splits are loaded at the same time.
+        kwargs: Further keyword arguments (e.g. location or fold) that are
+            passed to the dataset class for every split.
+
+    Returns:
+        A dict that maps each split name to its dataset.
+    """
+    num_workers = num_workers or max(len(splits), 1)
+    with ThreadPoolExecutor(num_workers) as executor:
+        futures = {split: executor.submit(dataset, split=split, **kwargs)
+                   for split in splits}
+        return {split: future.result() for split, future in futures.items()}
+
+
+class LoggingParseProgress(LoggingProgress):
+    def __init__(self, interval=1.0):
+        super().__init__(interval=interval, progress_str=_progress_string)
+
+
+class TerminalParseProgress(TerminalProgress):
+    def __init__(self, interval=1.0):
+        super().__init__(interval=interval, progress_str=_progress_string)
+
+
+def _progress_string(bytes_read: int, total_size: Optional[int], final: bool,
+                     stage: str = "fill", rows: int = 0,
+                     seconds: float = 0.0):
+    """
+    Returns a human-readable string representing the parse progress.
+
+    Args:
+        bytes_read: The number of bytes parsed so far.
+        total_size: The total number of bytes to parse or None if unknown.
+        final: Whether the parse pass has finished.
+        stage: The parse pass, either "count" or "fill".
+        rows: The number of rows parsed so far.
+        seconds: The time spent on the parse pass so far.
+    """
+    verb = "counting" if stage == "count" else "parsing"
+    rate = to_human_readable(bytes_read / seconds if seconds > 0 else 0)
+    if final:
+        return "finished %s [%s, %d rows, %s/s]" % (
+            verb, to_human_readable(bytes_read), rows, rate)
+    if total_size is None:
+        return "%s [%s / ?, %d rows, %s/s]" % (
+            verb, to_human_readable(bytes_read), rows, rate)
+    percent = int((100.0 * bytes_read) / total_size) if total_size > 0 else 100
+    return "%s %3d%% [%s / %s, %d rows, %s/s]" % (
+        verb, percent, to_human_readable(bytes_read),
+        to_human_readable(total_size), rows, rate)
+
+
+# Set default progress hook depending on whether the stdout is a terminal.
+if sys.stdout.isatty():
+    DefaultParseProgress = TerminalParseProgress
+else:
+    DefaultParseProgress = LoggingParseProgress
@@ -1,4 +1,5 @@
 """Generate pytrec_eval runs from model and labels."""
+from typing import List
 from typing import Optional
 from typing import Tuple
 from typing import Dict
@@ -16,7 +17,9 @@ def generate_pytrec_eval(scores: _torch.FloatTensor,
                          qids: Optional[_torch.LongTensor] = None,
                          qid_offset: int = 0,
                          q_prefix: str = "q",
-                         d_prefix: str = "d") -> _PYTREC_RETURN_TYPE:
+                         d_prefix: str = "d",
+                         docids: Optional[List[List[str]]] = None
+                         ) -> _PYTREC_RETURN_TYPE:
     """Generates `pytrec_eval <https://github.com/cvangysel/pytrec_eval>`_
     qrels and runs from given batch.
 
@@ -58,6 +61,11 @@ def generate_pytrec_eval(scores: _torch.FloatTensor,
             used if `qids` is None.
         q_prefix: A string prefix to add for query identifiers.
         d_prefix: A string prefix to add for doc identifiers.
+        docids: (Optional) a list with, for each query, the list of docids of
+            its documents in the same order as in `scores`, for example as
+            returned by
+            :meth:`pytorchltr.datasets.svmrank.SVMRankDataset.get_docids`.
+            If not given, docids are generated from the document positions.
 
     Returns:
         A tuple containing a qrel dict and a run dict.
@@ -76,7 +84,10 @@ def generate_pytrec_eval(scores: _torch.FloatTensor,
 
         # Iterate documents and get relevance and scores.
         for d in range(n[i]):
-            docid = "{:s}{:d}".format(d_prefix, d)
+            if docids is not None:
+                docid = docids[i][d]
+            else:
+                docid = "{:s}{:d}".format(d_prefix, d)
             qrel[qid][docid] = int(relevance[i, d])
             run[qid][docid] = float(scores[i, d])
 
@@ -1,7 +1,6 @@
 import logging
 import os
 import sys
-from collections import deque
 from urllib.request import urlopen
 from typing import Callable
 from typing import Optional
@@ -10,6 +9,7 @@ from pytorchltr.utils.file import ChecksumError
 from pytorchltr.utils.file import validate_file
 from pytorchltr.utils.progress import LoggingProgress
 from pytorchltr.utils.progress import TerminalProgress
+from pytorchltr.utils.progress import to_human_readable
 
 
 _PROGRESS_FN_TYPE = Callable[[int, Optional[int], bool], None]
@@ -170,34 +170,15 @@ def _progress_string(bytes_read: int, total_size: Optional[int], final: bool):
         total_size: The total number of bytes to read or None if unknown.
     """
     if final:
-        return "finished downloading [%s]" % _to_human_readable(bytes_read)
+        return "finished downloading [%s]" % to_human_readable(bytes_read)
     if total_size is None:
-        return "downloading [%s / ?]" % _to_human_readable(bytes_read)
+        return "downloading [%s / ?]" % to_human_readable(bytes_read)
     else:
         percent = int((100.0 * bytes_read) / total_size)
         return "downloading %3d%% [%s / %s]" % (
             percent,
-            _to_human_readable(bytes_read),
-            _to_human_readable(total_size))
-
-
-def _to_human_readable(nr_of_bytes: int):
-    """
-    Returns a human-readable string representation of given bytes.
-
-    Args:
-        nr_of_bytes: The number bytes
-    """
-    # Convert to human readble byte format
-    byte_unit = deque(["B", "KB", "MB", "GB", "TB"])
-    while len(byte_unit) > 1 and nr_of_bytes > 1024.0:
-        byte_unit.popleft()
-        nr_of_bytes /= 1024.0
-
-    byte_unit = byte_unit.popleft()
-    if nr_of_bytes < 10.0 and byte_unit != "B":
-        return "%.1f%s" % (nr_of_bytes, byte_unit)
-    return "%d%s" % (nr_of_bytes, byte_unit)
+            to_human_readable(bytes_read),
+            to_human_readable(total_size))
 
 
 # Set default progress hook depending on whether the stdout is a terminal.
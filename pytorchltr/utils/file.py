@@ -2,6 +2,7 @@ import hashlib
 import logging
 import os
 import tarfile
+import threading
 import zipfile
 from typing import Dict
 from typing import List
@@ -110,7 +111,37 @@ def validate_expected_files(location: str,
                     "str or a dict containing 'path' and 'sha256' keys.")
 
 
+def expected_sha256(expected_files: List[Union[str, Dict[str, str]]],
+                    path: str) -> Optional[str]:
+    """Returns the sha256 checksum listed for a file in a set of expected
+    files.
+
+    Args:
+        expected_files: A list of expected files for a resource, in the same
+            format as accepted by :func:`validate_expected_files`.
+        path: The path of the file relative to the resource location.
+
+    Returns:
+        The sha256 checksum of the file or None if it is not listed.
+    """
+    for f in expected_files:
+        if isinstance(f, dict) and \
+                os.path.normpath(f["path"]) == os.path.normpath(path):
+            return f["sha256"]
+    return None
+
+
 _DOWNLOADER_TYPE = "pytorchltr.utils.downloader.Downloader"
+_LOCATION_LOCKS = {}
+_LOCATION_LOCKS_LOCK = threading.Lock()
+
+
+def _location_lock(location: str) -> threading.Lock:
+    """Returns the lock that serializes validating and downloading the files
+    at given location within this process."""
+    with _LOCATION_LOCKS_LOCK:
+        return _LOCATION_LOCKS.setdefault(
+            os.path.abspath(location), threading.Lock())
 
 
 def validate_and_download(location: str,
@@ -120,6 +151,10 @@ def validate_and_download(location: str,
     """Validates expected files at given location and attempts to download
     if validation fails.
 
+    Concurrent calls for the same location (e.g. when loading several splits
+    of a dataset in parallel) are serialized, so that a missing dataset is
+    only downloaded once.
+
     Args:
         location: The location to check.
         expected_files: (Optional) a list of expected files for this resource.
@@ -129,21 +164,22 @@ def validate_and_download(location: str,
         downloader: The downloader to use when downloading files.
         validate_checksums: Whether to validate checksums.
     """
-    try:
-        logging.info("checking dataset files in '%s'", location)
-        validate_expected_files(
-            location, expected_files, validate_checksums)
-        logging.info("successfully checked all dataset files")
-    except (FileNotFoundError, ChecksumError):
-        logging.warning("dataset file(s) in '%s' are missing or corrupt",
-                        location)
-        if downloader is not None:
-            downloader.download(location)
+    with _location_lock(location):
+        try:
+            logging.info("checking dataset files in '%s'", location)
             validate_expected_files(
                 location, expected_files, validate_checksums)
             logging.info("successfully checked all dataset files")
-        else:
-            raise
+        except (FileNotFoundError, ChecksumError):
+            logging.warning("dataset file(s) in '%s' are missing or corrupt",
+                            location)
+            if downloader is not None:
+                downloader.download(location)
+                validate_expected_files(
+                    location, expected_files, validate_checksums)
+                logging.info("successfully checked all dataset files")
+            else:
+                raise
 
 
 def extract_tar(path: str, destination: str):
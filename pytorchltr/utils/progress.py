@@ -1,5 +1,6 @@
 import time
 import logging
+from collections import deque
 from typing import Callable
 from typing import Optional
 
@@ -7,7 +8,27 @@ from typing import Optional
 _PROGRESS_FN_TYPE = Callable[[int, Optional[int], bool], None]
 
 
-def _default_progress_str(progress: int, total: Optional[int], final: bool):
+def to_human_readable(nr_of_bytes: int):
+    """
+    Returns a human-readable string representation of given bytes.
+
+    Args:
+        nr_of_bytes: The number bytes
+    """
+    # Convert to human readble byte format
+    byte_unit = deque(["B", "KB", "MB", "GB", "TB"])
+    while len(byte_unit) > 1 and nr_of_bytes > 1024.0:
+        byte_unit.popleft()
+        nr_of_bytes /= 1024.0
+
+    byte_unit = byte_unit.popleft()
+    if nr_of_bytes < 10.0 and byte_unit != "B":
+        return "%.1f%s" % (nr_of_bytes, byte_unit)
+    return "%d%s" % (nr_of_bytes, byte_unit)
+
+
+def _default_progress_str(progress: int, total: Optional[int], final: bool,
+                          **stats):
     """
     Default progress string
 
@@ -15,6 +36,7 @@ def _default_progress_str(progress: int, total: Optional[int], final: bool):
         progress: The progress so far as an integer.
         total: The total progress.
         final: Whether this is the final call.
+        stats: Additional statistics about the progress (ignored).
 
     Returns:
         A formatted string representing the progress so far.
@@ -37,18 +59,22 @@ class IntervalProgress:
         self.progress_str = progress_str
         self.last_update = time.time() - interval
 
-    def __call__(self, progress: int, total: Optional[int], final: bool):
+    def __call__(self, progress: int, total: Optional[int], final: bool,
+                 **stats):
         if final or time.time() - self.last_update >= self.interval:
-            self.progress(progress, total, final)
+            self.progress(progress, total, final, **stats)
             self.last_update = time.time()
 
-    def progress(self, progress: int, total: Optional[int], final: bool):
+    def progress(self, progress: int, total: Optional[int], final: bool,
+                 **stats):
         """Processes the progress so far. Called only once per interval.
 
         Args:
             progress: The progress so far.
             total: The total to reach.
             final: Whether this is the final progress call.
+            stats: Additional statistics about the progress, passed on to
+                the progress string function.
         """
         raise NotImplementedError
 
@@ -57,14 +83,14 @@ class LoggingProgress(IntervalProgress):
     """
     An interval progress hook that reports to logging.info.
     """
-    def progress(self, progress, total, final):
-        logging.info(self.progress_str(progress, total, final))
+    def progress(self, progress, total, final, **stats):
+        logging.info(self.progress_str(progress, total, final, **stats))
 
 
 class TerminalProgress(IntervalProgress):
     """
     An interval progress hook that writes to the terminal via print.
     """
-    def progress(self, progress, total, final):
-        print("\033[K" + self.progress_str(progress, total, final),
+    def progress(self, progress, total, final, **stats):
+        print("\033[K" + self.progress_str(progress, total, final, **stats),
               end="\n" if final else "\r")
@@ -50,8 +50,6 @@ setup(
     ext_modules=get_svmrank_parser_ext(),
     include_dirs=[numpy.get_include()],
     install_requires=["numpy",
-                      "scikit-learn",
-                      "scipy",
                       "torch"],
     tests_require=["pytest"],
     classifiers=[
@@ -0,0 +1,610 @@
+import bz2
+import gc
+import gzip
+import io
+import lzma
+import os
+import logging
+import tempfile
+import threading
+import zipfile
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pytest
+import torch
+from pytest import raises
+from pytorchltr.datasets.svmrank.parser import iter_svmrank_file
+from pytorchltr.datasets.svmrank.parser import normalize_queries
+from pytorchltr.datasets.svmrank.parser import parse_svmrank_file
+
+
+dataset_file = "tests/datasets/resources/dataset.txt"
+
+
+def test_parse_basic():
+    xs, ys, qids = parse_svmrank_file(dataset_file)
+    assert xs.shape == (39, 45)
+    assert ys.shape == (39,)
+    assert qids.shape == (39,)
+    assert xs[1, 2] == 1.0
+    assert ys[1] == 2
+    assert qids[0] == 1
+    assert qids[-1] == 63
+
+
+def test_parse_missing_file_raises_error():
+    with raises(OSError):
+        parse_svmrank_file("tests/datasets/resources/nonexisting.txt")
+
+
+def test_parse_invalid_format_raises_error():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "invalid.txt")
+        with open(path, "wt") as f:
+            f.write("1 qid:1 1:0.5\nthis is not svmrank\n")
+        with raises(ValueError):
+            parse_svmrank_file(path)
+
+
+def test_parse_multithreaded_same_as_single_threaded():
+    xs, ys, qids = parse_svmrank_file(dataset_file)
+    for num_threads in [2, 3, 7, 100]:
+        for use_mmap in [True, False]:
+            xs_t, ys_t, qids_t = parse_svmrank_file(
+                dataset_file, num_threads=num_threads, use_mmap=use_mmap)
+            np.testing.assert_array_equal(xs, xs_t)
+            np.testing.assert_array_equal(ys, ys_t)
+            np.testing.assert_array_equal(qids, qids_t)
+
+
+def test_parse_mmap_same_as_buffered():
+    xs, ys, qids = parse_svmrank_file(dataset_file, use_mmap=True)
+    xs_b, ys_b, qids_b = parse_svmrank_file(dataset_file, use_mmap=False)
+    np.testing.assert_array_equal(xs, xs_b)
+    np.testing.assert_array_equal(ys, ys_b)
+    np.testing.assert_array_equal(qids, qids_b)
+
+
+def test_parse_multithreaded_queries_straddle_chunks():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "dataset.txt")
+        with open(path, "wt") as f:
+            for row in range(500):
+                f.write("%d qid:%d 1:%d.5 3:-%d # doc %d\n" % (
+                    row % 3, row // 37, row, row % 11, row))
+        xs, ys, qids = parse_svmrank_file(path, num_threads=4)
+        assert xs.shape == (500, 3)
+        np.testing.assert_array_equal(xs[:, 0], np.arange(500) + 0.5)
+        np.testing.assert_array_equal(xs[:, 1], np.zeros(500))
+        np.testing.assert_array_equal(xs[:, 2], -(np.arange(500) % 11))
+        np.testing.assert_array_equal(ys, np.arange(500) % 3)
+        np.testing.assert_array_equal(qids, np.arange(500) // 37)
+
+
+def test_parse_dtype_float32():
+    xs, ys, qids = parse_svmrank_file(dataset_file)
+    xs_32, ys_32, qids_32 = parse_svmrank_file(dataset_file, dtype=np.float32)
+    assert xs_32.dtype == np.float32
+    np.testing.assert_array_equal(xs.astype(np.float32), xs_32)
+    np.testing.assert_array_equal(ys, ys_32)
+    np.testing.assert_array_equal(qids, qids_32)
+
+
+def test_parse_dtype_float16_rounds_to_nearest():
+    rng = np.random.RandomState(4200)
+    values = np.concatenate([
+        rng.uniform(-1.0, 1.0, 200),
+        rng.uniform(-70000.0, 70000.0, 200),
+        10.0 ** rng.uniform(-9.0, -4.0, 200),
+        [0.0, 65504.0, 65520.0, 1e6, 2.0 ** -24, 2.0 ** -25, 1.0 + 2.0 ** -11,
+         1.0 + 3.0 * 2.0 ** -11, 5.960464477539063e-08, 6.097555160522461e-05]
+    ])
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "dataset.txt")
+        with open(path, "wt") as f:
+            for value in values:
+                f.write("0 qid:1 1:%.10e 2:1\n" % value)
+        xs, _, _ = parse_svmrank_file(path)
+        xs_16, _, _ = parse_svmrank_file(path, dtype=np.float16)
+        assert xs_16.dtype == np.float16
+        with np.errstate(over="ignore"):
+            expected = xs.astype(np.float16)
+        np.testing.assert_array_equal(
+            expected.view(np.uint16), xs_16.view(np.uint16))
+
+
+def _parse_values(values):
+    """Parses given strings as the feature values of a single query."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "dataset.txt")
+        with open(path, "wt") as f:
+            for value in values:
+                f.write("0 qid:1 1:%s\n" % value)
+        xs, _, _ = parse_svmrank_file(path)
+    return xs[:, 0]
+
+
+def test_parse_values_same_as_strtod():
+    rng = np.random.RandomState(42)
+    values = ["0", "1", "-1", "0.0", "-0.5", "1e5", "1E+3", "-2e-3",
+              "123456789012345", "0.000001", "9007199254740993",
+              "0.1", "0.2", "0.3", "1.7976931348623157e308", "5e-324"]
+    for x in rng.uniform(-1000.0, 1000.0, size=1000):
+        values.append("%.6f" % x)
+        values.append("%.12e" % x)
+        values.append(repr(float(x)))
+    for x in rng.lognormal(0.0, 20.0, size=1000):
+        values.append("%.15e" % x)
+    expected = np.array([float(value) for value in values])
+    np.testing.assert_array_equal(_parse_values(values), expected)
+
+
+def test_parse_long_mantissa():
+    values = ["1" * 40, "0." + "3" * 40, "-" + "9" * 30 + "." + "9" * 30,
+              "1" * 30 + "e-40", "1e99999999999"]
+    expected = np.array([float(value) for value in values])
+    np.testing.assert_allclose(_parse_values(values), expected, rtol=1e-15)
+
+
+def test_parse_unsupported_dtype_raises_error():
+    with raises(ValueError):
+        parse_svmrank_file(dataset_file, dtype=np.int32)
+
+
+def test_parse_sparse_same_as_dense():
+    xs, ys, qids = parse_svmrank_file(dataset_file)
+    for num_threads in [1, 3]:
+        xs_sparse, ys_sparse, qids_sparse = parse_svmrank_file(
+            dataset_file, num_threads=num_threads, sparse=True)
+        (data, indices, indptr), shape = xs_sparse
+        assert shape == xs.shape
+        assert indptr[0] == 0
+        assert indptr[-1] == len(data) == len(indices)
+        dense = np.zeros(shape)
+        for row in range(shape[0]):
+            cols = indices[indptr[row]:indptr[row + 1]]
+            dense[row, cols] = data[indptr[row]:indptr[row + 1]]
+        np.testing.assert_array_equal(xs, dense)
+        np.testing.assert_array_equal(ys, ys_sparse)
+        np.testing.assert_array_equal(qids, qids_sparse)
+
+
+def test_parse_compressed_same_as_uncompressed():
+    xs, ys, qids = parse_svmrank_file(dataset_file)
+    with open(dataset_file, "rb") as f:
+        contents = f.read()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name, open_fn in [("dataset.txt.gz", gzip.open),
+                              ("dataset.txt.bz2", bz2.open),
+                              ("dataset.xz", lzma.open)]:
+            path = os.path.join(tmpdir, name)
+            with open_fn(path, "wb") as f:
+                f.write(contents)
+            for chunk_size in [1, 13, 1 << 20]:
+                for sparse in [False, True]:
+                    actual = parse_svmrank_file(
+                        path, num_threads=4, sparse=sparse,
+                        chunk_size=chunk_size)
+                    expected = parse_svmrank_file(
+                        dataset_file, sparse=sparse)
+                    if sparse:
+                        for a, e in zip(actual[0][0], expected[0][0]):
+                            np.testing.assert_array_equal(a, e)
+                    else:
+                        np.testing.assert_array_equal(actual[0], xs)
+                    np.testing.assert_array_equal(actual[1], ys)
+                    np.testing.assert_array_equal(actual[2], qids)
+            for (xs_q, ys_q, qid), start in zip(
+                    iter_svmrank_file(path, chunk_size=13),
+                    np.flatnonzero(np.r_[True, qids[1:] != qids[:-1]])):
+                np.testing.assert_array_equal(
+                    xs_q, xs[start:start + len(ys_q)])
+                assert qid == qids[start]
+
+
+def test_parse_invalid_compressed_raises_error():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "invalid.txt.gz")
+        with gzip.open(path, "wb") as f:
+            f.write(b"1 qid:1 1:0.5\nthis is not svmrank\n")
+        with raises(ValueError):
+            parse_svmrank_file(path)
+
+
+def test_parse_buffer_same_as_file():
+    xs, ys, qids = parse_svmrank_file(dataset_file)
+    with open(dataset_file, "rb") as f:
+        contents = f.read()
+    for buffer in [contents, bytearray(contents), memoryview(contents),
+                   np.frombuffer(contents, dtype=np.uint8)]:
+        for num_threads in [1, 3]:
+            xs_b, ys_b, qids_b = parse_svmrank_file(
+                buffer, num_threads=num_threads)
+            np.testing.assert_array_equal(xs, xs_b)
+            np.testing.assert_array_equal(ys, ys_b)
+            np.testing.assert_array_equal(qids, qids_b)
+
+
+class _BytesPath:
+    """A path-like object whose path is bytes."""
+    def __init__(self, path):
+        self._path = path
+
+    def __fspath__(self):
+        return os.fsencode(self._path)
+
+
+def test_parse_path_like_same_as_str():
+    xs, ys, qids = parse_svmrank_file(dataset_file)
+    for path in [Path(dataset_file), _BytesPath(dataset_file)]:
+        xs_p, ys_p, qids_p = parse_svmrank_file(path)
+        np.testing.assert_array_equal(xs, xs_p)
+        np.testing.assert_array_equal(ys, ys_p)
+        np.testing.assert_array_equal(qids, qids_p)
+
+
+def test_parse_zip_member_same_as_file():
+    xs, ys, qids = parse_svmrank_file(dataset_file)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "dataset.zip")
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.write(dataset_file, "Fold1/train.txt")
+        with zipfile.ZipFile(path) as archive:
+            with archive.open("Fold1/train.txt") as f:
+                xs_z, ys_z, qids_z = parse_svmrank_file(f, chunk_size=13)
+    np.testing.assert_array_equal(xs, xs_z)
+    np.testing.assert_array_equal(ys, ys_z)
+    np.testing.assert_array_equal(qids, qids_z)
+
+
+def test_parse_non_seekable_file_object():
+    xs, ys, qids = parse_svmrank_file(dataset_file)
+    with open(dataset_file, "rb") as f:
+        contents = f.read()
+    stream = mock.Mock()
+    stream.seekable.return_value = False
+    stream.read.return_value = contents
+    xs_s, ys_s, qids_s = parse_svmrank_file(stream)
+    np.testing.assert_array_equal(xs, xs_s)
+    np.testing.assert_array_equal(ys, ys_s)
+    np.testing.assert_array_equal(qids, qids_s)
+
+
+class _Reader:
+    """A minimal file object that can only be read."""
+    def __init__(self, contents):
+        self._contents = contents
+
+    def read(self, *args):
+        contents, self._contents = self._contents, b""
+        return contents
+
+
+def test_parse_reader_without_seekable():
+    xs, ys, qids = parse_svmrank_file(dataset_file)
+    with open(dataset_file, "rb") as f:
+        xs_r, ys_r, qids_r = parse_svmrank_file(_Reader(f.read()))
+    np.testing.assert_array_equal(xs, xs_r)
+    np.testing.assert_array_equal(ys, ys_r)
+    np.testing.assert_array_equal(qids, qids_r)
+
+
+def test_parse_empty_buffer():
+    xs, ys, qids = parse_svmrank_file(b"")
+    assert ys.shape == (0,)
+    assert qids.shape == (0,)
+
+
+def test_parse_invalid_buffer_raises_error():
+    with raises(ValueError):
+        parse_svmrank_file(b"1 qid:1 1:0.5\nthis is not svmrank\n")
+
+
+def test_parse_columns():
+    xs, ys, qids = parse_svmrank_file(dataset_file)
+    columns = [45, 3, 1, 100, 7]
+    expected = np.zeros((xs.shape[0], len(columns)))
+    expected[:, :3] = xs[:, [44, 2, 0]]
+    expected[:, 4] = xs[:, 6]
+    for num_threads in [1, 3]:
+        for use_mmap in [True, False]:
+            actual, actual_ys, actual_qids = parse_svmrank_file(
+                dataset_file, num_threads=num_threads, use_mmap=use_mmap,
+                columns=columns)
+            np.testing.assert_array_equal(actual, expected)
+            np.testing.assert_array_equal(actual_ys, ys)
+            np.testing.assert_array_equal(actual_qids, qids)
+
+
+def test_parse_columns_sparse():
+    columns = [45, 3, 1, 100, 7]
+    expected, _, _ = parse_svmrank_file(dataset_file, columns=columns)
+    (data, indices, indptr), shape = parse_svmrank_file(
+        dataset_file, columns=columns, sparse=True)[0]
+    assert shape == expected.shape
+    actual = np.zeros(shape)
+    for row in range(shape[0]):
+        start, end = indptr[row], indptr[row + 1]
+        actual[row, indices[start:end]] = data[start:end]
+    np.testing.assert_array_equal(actual, expected)
+
+
+def test_parse_columns_skip_across_buffers():
+    rng = np.random.RandomState(7)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "dataset.txt")
+        with open(path, "wt") as f:
+            for row in range(2000):
+                feats = " ".join(
+                    "%d:%.*e" % (col, rng.randint(1, 12), rng.uniform(-9, 9))
+                    for col in range(1, 11))
+                f.write("%d qid:%d %s # doc %d\r\n" % (
+                    row % 3, row // 37, feats, row))
+        xs, _, _ = parse_svmrank_file(path)
+        for use_mmap in [True, False]:
+            actual, _, _ = parse_svmrank_file(
+                path, use_mmap=use_mmap, columns=[10, 2, 5])
+            np.testing.assert_array_equal(actual, xs[:, [9, 1, 4]])
+
+
+def test_parse_no_columns():
+    xs, ys, qids = parse_svmrank_file(dataset_file, columns=[])
+    assert xs.shape == (39, 0)
+    assert ys.shape == (39,)
+
+
+def test_parse_invalid_columns_raises_error():
+    with raises(ValueError):
+        parse_svmrank_file(dataset_file, columns=[1, 2, 1])
+    with raises(ValueError):
+        parse_svmrank_file(dataset_file, columns=[-1])
+
+
+def test_parse_comments():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "dataset.txt")
+        with open(path, "wb") as f:
+            f.write(b"# header comment\n"
+                    b"1 qid:1 1:0.5 2:1 #docid = a1\n"
+                    b"0 qid:1 1:0.25\n"
+                    b"2 qid:2 # b2 \xc3\xa9\r\n"
+                    b"0 qid:2 2:3.5 #\n"
+                    b"1 qid:3 1:1 #c3#d3")
+        xs, ys, qids, (data, offsets) = parse_svmrank_file(
+            path, comments=True)
+        expected = [b"docid = a1", b"", b" b2 \xc3\xa9", b"", b"c3#d3"]
+        assert [bytes(data[offsets[i]:offsets[i + 1]])
+                for i in range(len(ys))] == expected
+        np.testing.assert_array_equal(
+            xs, [[0.5, 1.0], [0.25, 0.0], [0.0, 0.0], [0.0, 3.5],
+                 [1.0, 0.0]])
+        np.testing.assert_array_equal(ys, [1, 0, 2, 0, 1])
+
+    # CRLF line endings are not part of comments, also when a line ending
+    # straddles the buffers a stream is read in
+    contents = (b"2 qid:2 1:0.3 #B1\r\n1 qid:2 1:0.1 #x\ry\r\n"
+                b"0 qid:3 1:0.2 #\r\n1 qid:3 1:0.4 #z\r")
+    expected = [b"B1", b"x\ry", b"", b"z"]
+    sources = [(contents, 1 << 20)] + [
+        (io.BytesIO(contents), chunk_size)
+        for chunk_size in range(1, len(contents) + 1)]
+    for source, chunk_size in sources:
+        xs, ys, qids, (data, offsets) = parse_svmrank_file(
+            source, comments=True, chunk_size=chunk_size)
+        assert [bytes(data[offsets[i]:offsets[i + 1]])
+                for i in range(len(ys))] == expected
+        np.testing.assert_array_equal(ys, [2, 1, 0, 1])
+
+
+class _ChangingFile(io.BytesIO):
+    """A file object whose contents change after the first pass."""
+    def __init__(self, first, second):
+        super().__init__(first)
+        self._second = second
+        self._seeks = 0
+
+    def seek(self, *args):
+        self._seeks += 1
+        if self._seeks == 2:
+            self.truncate(0)
+            super().seek(0)
+            self.write(self._second)
+        return super().seek(*args)
+
+
+def test_parse_comments_longer_in_fill_pass_raises_error():
+    first = b"1 qid:1 1:0.5 #a\n0 qid:1 1:0.25 #b\n"
+    second = b"1 qid:1 1:0.5 #" + b"a" * 4096 + b"\n0 qid:1 1:0.25 #b\n"
+    with raises(ValueError):
+        parse_svmrank_file(_ChangingFile(first, second), comments=True)
+    _, ys, _, (data, offsets) = parse_svmrank_file(
+        _ChangingFile(first, first), comments=True)
+    assert bytes(data) == b"ab"
+
+
+def test_parse_comments_multithreaded():
+    xs, ys, qids, (data, offsets) = parse_svmrank_file(
+        dataset_file, comments=True)
+    assert bytes(data[offsets[0]:offsets[1]]) == b"docid = 244338"
+    for num_threads in [2, 7]:
+        for use_mmap in [True, False]:
+            _, _, _, (actual_data, actual_offsets) = parse_svmrank_file(
+                dataset_file, num_threads=num_threads, use_mmap=use_mmap,
+                comments=True, columns=[1])
+            np.testing.assert_array_equal(actual_data, data)
+            np.testing.assert_array_equal(actual_offsets, offsets)
+
+
+def test_parse_progress():
+    size = os.path.getsize(dataset_file)
+    for num_threads in [1, 3]:
+        for use_mmap in [True, False]:
+            progress_fn = mock.MagicMock()
+            parse_svmrank_file(dataset_file, num_threads=num_threads,
+                               use_mmap=use_mmap, progress_fn=progress_fn)
+            finals = [c for c in progress_fn.call_args_list if c[0][2]]
+            assert [c[1]["stage"] for c in finals] == ["count", "fill"]
+            for c in finals:
+                assert c[0][:2] == (size, size)
+                assert c[1]["rows"] == 39
+                assert c[1]["seconds"] >= 0.0
+
+
+def test_parse_concurrently_from_several_threads():
+    expected = parse_svmrank_file(dataset_file, comments=True)
+    results = [None] * 8
+
+    def parse(index):
+        results[index] = parse_svmrank_file(
+            dataset_file, num_threads=1 + index % 3, sparse=index % 2 == 1,
+            comments=True)
+
+    threads = [threading.Thread(target=parse, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for index, (xs, ys, qids, comments) in enumerate(results):
+        if index % 2 == 1:
+            (data, indices, indptr), shape = xs
+            xs = np.zeros(shape)
+            for row in range(shape[0]):
+                xs[row, indices[indptr[row]:indptr[row + 1]]] = \
+                    data[indptr[row]:indptr[row + 1]]
+        np.testing.assert_array_equal(xs, expected[0])
+        np.testing.assert_array_equal(ys, expected[1])
+        np.testing.assert_array_equal(qids, expected[2])
+        np.testing.assert_array_equal(comments[0], expected[3][0])
+
+
+def _rss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"),
+                    reason="requires /proc/self/statm")
+def test_parse_repeatedly_releases_memory():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "wide.txt")
+        with open(path, "wt") as f:
+            for row in range(2000):
+                f.write("%d qid:%d 1:1 1000:2.5 # doc%d\n" % (
+                    row % 3, row // 10, row))
+        nbytes = 2000 * 1000 * 8
+        for sparse in [False, True]:
+            for i in range(13):
+                out = parse_svmrank_file(path, sparse=sparse, comments=True)
+                del out
+                gc.collect()
+                if i == 2:
+                    rss = _rss()
+            assert _rss() - rss < nbytes
+
+
+class _FailingFile(io.BytesIO):
+    """A file object that fails to be read halfway through the fill pass."""
+    def __init__(self, contents):
+        super().__init__(contents)
+        self._seeks = 0
+        self._fill_reads = 0
+
+    def seek(self, *args):
+        self._seeks += 1
+        return super().seek(*args)
+
+    def read(self, *args):
+        if self._seeks > 1:
+            self._fill_reads += 1
+            if self._fill_reads > 1:
+                raise OSError("read failed")
+        return super().read(*args)
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"),
+                    reason="requires /proc/self/statm")
+def test_parse_failing_fill_pass_releases_memory():
+    contents = b"".join(b"%d qid:%d 1:1 1000:2.5\n" % (row % 3, row // 10)
+                        for row in range(2000))
+    nbytes = 2000 * 1000 * 8
+    for i in range(13):
+        with raises(OSError):
+            parse_svmrank_file(_FailingFile(contents))
+        gc.collect()
+        if i == 2:
+            rss = _rss()
+    assert _rss() - rss < nbytes
+
+
+def test_parse_output_outlives_views():
+    xs, ys, qids = parse_svmrank_file(dataset_file)
+    expected = xs.copy()
+    features = torch.from_numpy(xs[1:3])
+    del xs
+    gc.collect()
+    np.testing.assert_array_equal(features.numpy(), expected[1:3])
+
+
+def test_parse_logs_stats(caplog):
+    with caplog.at_level(logging.INFO):
+        parse_svmrank_file(dataset_file, num_threads=2)
+    records = [r for r in caplog.records
+               if hasattr(r, "svmrank_parse_stats")]
+    assert len(records) == 1
+    stats = records[0].svmrank_parse_stats
+    assert stats["bytes"] == os.path.getsize(dataset_file)
+    assert stats["rows"] == 39
+    assert stats["chunks"] == 2
+
+
+def test_iter_same_as_parse():
+    xs, ys, qids = parse_svmrank_file(dataset_file)
+    offsets = np.hstack(
+        [[0], np.where(qids[1:] != qids[:-1])[0] + 1, [len(qids)]])
+    for chunk_size in [1, 7, 100, 1 << 20]:
+        queries = list(iter_svmrank_file(dataset_file, chunk_size=chunk_size))
+        assert len(queries) == len(offsets) - 1
+        for (xs_q, ys_q, qid), start, end in zip(
+                queries, offsets[:-1], offsets[1:]):
+            np.testing.assert_array_equal(xs_q, xs[start:end])
+            np.testing.assert_array_equal(ys_q, ys[start:end])
+            assert qid == qids[start]
+
+
+def test_iter_dtype():
+    xs, _, _ = parse_svmrank_file(dataset_file, dtype=np.float32)
+    queries = list(iter_svmrank_file(dataset_file, dtype=np.float32))
+    xs_iter = np.vstack([xs_q for xs_q, _, _ in queries])
+    assert xs_iter.dtype == np.float32
+    np.testing.assert_array_equal(xs, xs_iter)
+
+
+def test_iter_empty_file():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "empty.txt")
+        open(path, "wt").close()
+        assert list(iter_svmrank_file(path)) == []
+
+
+def test_iter_invalid_format_raises_error():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "invalid.txt")
+        with open(path, "wt") as f:
+            f.write("1 qid:1 1:0.5\nthis is not svmrank\n")
+        with raises(ValueError):
+            list(iter_svmrank_file(path))
+
+
+def test_normalize_queries():
+    xs = np.array([[1.0, 2.0], [3.0, 2.0], [-1.0, 5.0], [0.5, 0.0],
+                   [7.0, 7.0]], dtype=np.float32)
+    normalize_queries(xs, np.array([0, 2, 4, 5]))
+    np.testing.assert_array_equal(xs, np.array(
+        [[0.0, 0.0], [1.0, 0.0], [0.0, 1.0], [1.0, 0.0], [0.0, 0.0]]))
+
+
+def test_normalize_queries_invalid_offsets_raises_error():
+    with raises(ValueError):
+        normalize_queries(np.zeros((3, 2)), np.array([0, 2, 4]))
@@ -1,7 +1,11 @@
 import os
+import shutil
+import tempfile
+from unittest import mock
 
 import pytest
 from pytorchltr.datasets.svmrank.example3 import Example3
+from pytorchltr.utils.file import ChecksumError
 from tests.datasets.svmrank.test_svmrank import mock_svmrank_dataset
 
 
@@ -42,3 +46,34 @@ def test_call_super_test():
         assert kwargs["file"] == os.path.join(tmpdir, "example3", "test.dat")
         assert kwargs["normalize"]
         assert kwargs["filter_queries"]
+
+
+def test_cache_hit_skips_checksums():
+    checksum_strs = ["pytorchltr.utils.file.sha256_checksum",
+                     "pytorchltr.datasets.svmrank.svmrank.sha256_checksum"]
+    parse_str = "pytorchltr.datasets.svmrank.svmrank.parse_svmrank_file"
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.makedirs(os.path.join(tmpdir, "example3"))
+        for f in Example3.expected_files:
+            shutil.copy("tests/datasets/resources/dataset.txt",
+                        os.path.join(tmpdir, f["path"]))
+
+        # The files do not match their listed checksums, so they are only
+        # loaded as long as no checksum is computed.
+        with mock.patch(checksum_strs[0]) as mock_file, \
+                mock.patch(checksum_strs[1]) as mock_svmrank:
+            expected = Example3(tmpdir, download=False, cache=True,
+                                validate_checksums=False)
+            with mock.patch(parse_str) as mock_parse:
+                cached = Example3(tmpdir, download=False, cache=True)
+                assert not mock_parse.called
+            assert not mock_file.called
+            assert not mock_svmrank.called
+        assert len(cached) == len(expected)
+        assert cached[0].features.equal(expected[0].features)
+
+        # Once the file changes, its checksum is validated again
+        path = os.path.join(tmpdir, Example3.splits["train"])
+        os.utime(path, (0, 0))
+        with pytest.raises(ChecksumError):
+            Example3(tmpdir, download=False, cache=True)
@@ -58,3 +58,22 @@ def test_call_super_test():
         assert kwargs["file"] == os.path.join(tmpdir, "Fold5", "test.txt")
         assert kwargs["normalize"]
         assert kwargs["filter_queries"]
+
+
+def test_call_super_cache():
+    with mock_svmrank_dataset(pkg) as (tmpdir, mock_super, mock_vali):
+        MSLR10K(tmpdir, split="train", fold=1)
+        args, kwargs = mock_super.call_args
+        assert kwargs["cache_dir"] is None
+        MSLR10K(tmpdir, split="train", fold=1, cache=True)
+        args, kwargs = mock_super.call_args
+        assert kwargs["cache_dir"] == os.path.join(tmpdir, "cache")
+        assert kwargs["sha256"] == MSLR10K.per_fold_expected_files[1][0][
+            "sha256"]
+
+
+def test_call_super_columns():
+    with mock_svmrank_dataset(pkg) as (tmpdir, mock_super, mock_vali):
+        MSLR10K(tmpdir, split="train", fold=1, columns=[1, 2, 3])
+        args, kwargs = mock_super.call_args
+        assert kwargs["columns"] == [1, 2, 3]
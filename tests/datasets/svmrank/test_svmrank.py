@@ -1,12 +1,28 @@
 import contextlib
+import os
 import pickle
+import shutil
 import tempfile
+from multiprocessing.reduction import ForkingPickler
 from unittest import mock
 
+import numpy as np
+import torch
+import torch.multiprocessing  # noqa: F401
 from pytest import raises
 from pytest import approx
+from pytest import warns
+from pytorchltr.datasets.svmrank.svmrank import LoggingParseProgress
 from pytorchltr.datasets.svmrank.svmrank import SVMRankDataset
+from pytorchltr.datasets.svmrank.svmrank import SVMRankItem
+from pytorchltr.datasets.svmrank.svmrank import SVMRankItems
+from pytorchltr.datasets.svmrank.svmrank import SVMRankIterableDataset
+from pytorchltr.datasets.svmrank.svmrank import load_splits
+from pytorchltr.datasets.svmrank.svmrank import _normalize_queries
+from pytorchltr.datasets.svmrank.svmrank import _normalize_query
+from pytorchltr.datasets.list_sampler import ListSampler
 from pytorchltr.datasets.list_sampler import UniformSampler
+from pytorchltr.utils.file import sha256_checksum
 
 
 def get_sample_dataset(*args, **kwargs):
@@ -70,6 +86,16 @@ def test_basic():
     assert q == 63
 
 
+def test_getitem_returns_views():
+    for dtype in [np.float32, np.float64]:
+        dataset = get_sample_dataset(dtype=dtype)
+        first, second = dataset[1], dataset[1]
+        assert first.features.data_ptr() == second.features.data_ptr()
+        assert first.relevance.data_ptr() == second.relevance.data_ptr()
+        assert first.relevance.dtype == torch.long
+        assert first.features.is_contiguous()
+
+
 def test_sparse():
 
     # Load data set.
@@ -91,6 +117,18 @@ def test_sparse():
             sample_dense.relevance.numpy())
 
 
+def test_sparse_getitem_returns_views():
+    for filter_queries in [False, True]:
+        dataset = get_sample_dataset(sparse=True,
+                                     filter_queries=filter_queries)
+        first, second = dataset[1], dataset[1]
+        for a, b in [(first.features._values(), second.features._values()),
+                     (first.features._indices(), second.features._indices())]:
+            assert a.data_ptr() == b.data_ptr()
+        assert first.features.shape == (first.n, 45)
+        assert first.features._indices()[0].max() < first.n
+
+
 def test_normalize():
 
     # Load data set.
@@ -121,6 +159,30 @@ def test_normalize():
     assert float(x[5, 0]) == approx(0.12121212121212122)
 
 
+def test_normalize_queries_same_as_per_query():
+    rng = np.random.RandomState(4200)
+    counts = np.array([1, 5, 40, 2, 1, 17, 3])
+    offsets = np.hstack([[0], np.cumsum(counts)])
+    for dtype in [np.float64, np.float32, np.float16]:
+        xs = rng.uniform(-10.0, 10.0, (offsets[-1], 6)).astype(dtype)
+        xs[:, 2] = 3.0
+        xs[:, 4] = np.round(xs[:, 4])
+        expected = xs.copy()
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            _normalize_query(expected[start:end])
+        for block_size in [1, 7, 1 << 14]:
+            for order in ["C", "F"]:
+                actual = xs.copy(order=order)
+                _normalize_queries(actual, offsets, block_size=block_size)
+                np.testing.assert_array_equal(actual, expected)
+
+
+def test_normalize_queries_empty():
+    xs = np.zeros((0, 3))
+    _normalize_queries(xs, np.array([0, 0]))
+    assert xs.shape == (0, 3)
+
+
 def test_sparse_normalize():
 
     # This should raise an error as it is not implemented.
@@ -193,6 +255,50 @@ def test_double_serialize():
         assert q1 == q2
 
 
+def _synthetic_contents(rows=2000, cols=100):
+    rng = np.random.RandomState(4200)
+    lines = []
+    for row in range(rows):
+        features = " ".join("%d:%.3f" % (col + 1, value) for col, value in
+                            enumerate(rng.uniform(size=cols)))
+        lines.append("%d qid:%d %s # doc%d\n" % (
+            row % 3, row // 20, features, row))
+    return "".join(lines).encode("ascii")
+
+
+def test_share_memory():
+    contents = _synthetic_contents()
+    for sparse in [False, True]:
+        expected = SVMRankDataset(contents, sparse=sparse,
+                                  normalize=not sparse, filter_queries=True)
+        dataset = SVMRankDataset(contents, sparse=sparse,
+                                 normalize=not sparse, filter_queries=True,
+                                 comments=True, share_memory=True)
+        nbytes = dataset[0].features.element_size() * 2000 * 100
+
+        # Pickling for workers only sends handles to the shared memory
+        pickled = ForkingPickler.dumps(dataset)
+        assert len(pickled) < nbytes / 10
+        loaded = pickle.loads(pickled)
+        assert len(pickled) < len(pickle.dumps(expected)) / 10
+
+        assert len(loaded) == len(expected)
+        for i in range(len(expected)):
+            features = loaded[i].features
+            if sparse:
+                assert features._values().is_shared()
+                assert features._indices().is_shared()
+                features = features.to_dense()
+                assert features.equal(expected[i].features.to_dense())
+            else:
+                assert features.is_shared()
+                assert features.equal(expected[i].features)
+            assert loaded[i].qid == expected[i].qid
+            assert loaded[i].relevance.equal(expected[i].relevance)
+        assert loaded.get_index(expected[2].qid) == 2
+        assert loaded.get_docids(0) == dataset.get_docids(0)
+
+
 def test_collate_sparse_10():
 
     # Load data set.
@@ -253,6 +359,159 @@ def test_collate_dense_3():
     assert tensor_batch.features.shape == (3, 3, 45)
 
 
+def _assert_batches_equal(actual, expected):
+    assert actual.features.equal(expected.features)
+    assert actual.relevance.equal(expected.relevance)
+    assert actual.n.equal(expected.n)
+    assert actual.qid.equal(expected.qid)
+    assert actual.sparse == expected.sparse
+
+
+def test_getitems_collate_same_as_getitem():
+    for filter_queries in [False, True]:
+        dataset = get_sample_dataset(normalize=True,
+                                     filter_queries=filter_queries)
+        indices = [2, 0, 1, 0]
+        items = dataset.__getitems__(indices)
+        assert isinstance(items, SVMRankItems)
+        assert len(items) == len(indices)
+        for item, index in zip(items, indices):
+            assert item.qid == dataset[index].qid
+            assert item.features.equal(dataset[index].features)
+        for max_list_size in [None, 3, 100]:
+            packed = SVMRankDataset.collate_fn(UniformSampler(
+                max_list_size, generator=torch.Generator().manual_seed(1)))
+            listed = SVMRankDataset.collate_fn(UniformSampler(
+                max_list_size, generator=torch.Generator().manual_seed(1)))
+            _assert_batches_equal(
+                packed(items), listed([dataset[i] for i in indices]))
+
+
+def test_collate_independent_items():
+    xs = [torch.arange(12, dtype=torch.float64).view(4, 3) + 1,
+          torch.ones(1, 3, dtype=torch.float64)]
+    ys = [torch.tensor([0, 1, 2, 3]), torch.tensor([4])]
+    batch = [SVMRankItem(x, y, len(y), qid, False)
+             for x, y, qid in zip(xs, ys, [7, 3])]
+
+    out = SVMRankDataset.collate_fn()(batch)
+    assert out.features.dtype == torch.float64
+    assert out.features[0].equal(xs[0])
+    assert out.features[1, 0].equal(xs[1][0])
+    assert (out.features[1, 1:] == 0).all()
+    assert out.relevance.tolist() == [[0, 1, 2, 3], [4, 0, 0, 0]]
+    assert out.n.tolist() == [4, 1]
+    assert out.qid.tolist() == [7, 3]
+
+    out = SVMRankDataset.collate_fn(ListSampler(2))(batch)
+    assert out.features[0].equal(xs[0][:2])
+    assert out.relevance.tolist() == [[0, 1], [4, 0]]
+    assert out.n.tolist() == [2, 1]
+
+
+class _RelevantListSampler(ListSampler):
+    def max_list_size(self, relevance):
+        return max(int((relevance > 0).sum()), 1)
+
+
+def test_collate_overridden_max_list_size():
+    indices = [0, 1, 2]
+    sampler = _RelevantListSampler()
+    collate_fn = SVMRankDataset.collate_fn(sampler)
+    dense = get_sample_dataset()
+    sparse = get_sample_dataset(sparse=True)
+    items = [dense[i] for i in indices]
+    list_size = max(sampler.max_list_size(item.relevance) for item in items)
+    assert list_size < max(item.n for item in items)
+    expected = torch.zeros((len(items), list_size, 45))
+    for i, item in enumerate(items):
+        rows = item.features[sampler(item.relevance)] \
+            if item.n > list_size else item.features
+        expected[i, :len(rows)] = rows
+
+    for batch in [collate_fn(dense.__getitems__(indices)), collate_fn(items),
+                  collate_fn([sparse[i] for i in indices])]:
+        features = batch.features
+        if batch.sparse:
+            features = features.to_dense()
+        assert features.equal(expected)
+        assert batch.n.tolist() == [min(item.n, list_size) for item in items]
+
+
+class _FixedListSampler(ListSampler):
+    def max_list_size(self, relevance):
+        return 20
+
+
+def test_collate_list_size_larger_than_lists():
+    indices = [0, 1, 2]
+    collate_fn = SVMRankDataset.collate_fn(_FixedListSampler())
+    dense = get_sample_dataset()
+    sparse = get_sample_dataset(sparse=True)
+    items = [dense[i] for i in indices]
+    assert max(item.n for item in items) < 20
+    expected = collate_fn(dense.__getitems__(indices))
+    assert expected.features.shape == (3, 20, 45)
+    assert expected.relevance.shape == (3, 20)
+    _assert_batches_equal(collate_fn(items), expected)
+    actual = collate_fn([sparse[i] for i in indices])
+    assert actual.features.to_dense().equal(expected.features)
+    assert actual.relevance.equal(expected.relevance)
+    assert actual.n.equal(expected.n)
+
+
+def test_getitems_data_loader():
+    dataset = get_sample_dataset(normalize=True)
+    loader = torch.utils.data.DataLoader(
+        dataset, batch_size=3, collate_fn=dataset.collate_fn())
+    collate_fn = dataset.collate_fn()
+    for start, batch in zip(range(0, len(dataset), 3), loader):
+        expected = collate_fn([dataset[i] for i in
+                               range(start, min(start + 3, len(dataset)))])
+        _assert_batches_equal(batch, expected)
+
+
+def test_getitems_sparse_returns_items():
+    dataset = get_sample_dataset(sparse=True)
+    items = dataset.__getitems__([1, 0])
+    assert [item.qid for item in items] == [dataset[1].qid, dataset[0].qid]
+
+
+def test_collate_sparse_same_as_dense():
+    sparse = get_sample_dataset(sparse=True)
+    dense = get_sample_dataset(sparse=False)
+    indices = [2, 0, 1, 0]
+    for max_list_size in [None, 3, 100]:
+        collate_sparse = SVMRankDataset.collate_fn(UniformSampler(
+            max_list_size, generator=torch.Generator().manual_seed(1)))
+        collate_dense = SVMRankDataset.collate_fn(UniformSampler(
+            max_list_size, generator=torch.Generator().manual_seed(1)))
+        actual = collate_sparse([sparse[i] for i in indices])
+        expected = collate_dense([dense[i] for i in indices])
+        assert actual.sparse and actual.features.is_sparse
+        assert actual.features.to_dense().equal(expected.features)
+        assert actual.relevance.equal(expected.relevance)
+        assert actual.n.equal(expected.n)
+        assert actual.qid.equal(expected.qid)
+
+
+def test_collate_sparse_uncoalesced():
+    dataset = get_sample_dataset(sparse=True)
+    item = dataset[1]
+    ind = item.features._indices()
+    val = item.features._values()
+    item.features = torch.sparse_coo_tensor(
+        torch.cat([ind, ind], dim=1), torch.cat([val, val]) / 2,
+        item.features.shape)
+    collate_fn = SVMRankDataset.collate_fn(UniformSampler(
+        3, generator=torch.Generator().manual_seed(1)))
+    expected = SVMRankDataset.collate_fn(UniformSampler(
+        3, generator=torch.Generator().manual_seed(1)))([dataset[1]])
+    actual = collate_fn([item])
+    assert actual.features.to_dense().numpy() == approx(
+        expected.features.to_dense().numpy())
+
+
 def test_collate_sparse_all():
 
     # Load data set.
@@ -311,3 +570,287 @@ def test_get_index_filtered_queries():
     # Assert that get_index for each qid matches the index.
     for i in range(len(dataset)):
         assert dataset.get_index(dataset[i].qid) == i
+
+
+def test_get_indices():
+    for filter_queries in [False, True]:
+        dataset = get_sample_dataset(filter_queries=filter_queries)
+        qids = [dataset[i].qid for i in range(len(dataset))]
+        np.testing.assert_array_equal(
+            dataset.get_indices(qids[::-1]),
+            np.arange(len(dataset))[::-1])
+        np.testing.assert_array_equal(
+            dataset.get_indices(np.array(qids[:1] * 3)), [0, 0, 0])
+
+
+def test_get_indices_missing_qid_raises_error():
+    dataset = get_sample_dataset(filter_queries=True)
+    unfiltered = get_sample_dataset()
+    qids = {unfiltered[i].qid for i in range(len(unfiltered))}
+    filtered_qids = {dataset[i].qid for i in range(len(dataset))}
+    missing = sorted(qids - filtered_qids)
+    assert len(missing) > 0
+    with raises(KeyError):
+        dataset.get_index(missing[0])
+    with raises(KeyError):
+        dataset.get_indices([dataset[0].qid, missing[0]])
+    with raises(KeyError):
+        dataset.get_index(-1)
+    with raises(KeyError):
+        dataset.get_index(10 ** 6)
+
+
+def test_filter_queries_same_as_per_query():
+    dataset = get_sample_dataset()
+    dataset_filtered = get_sample_dataset(filter_queries=True)
+    expected = [i for i in range(len(dataset))
+                if float(dataset[i].relevance.sum()) > 0.0]
+    assert len(dataset_filtered) == len(expected)
+    for index, i in enumerate(expected):
+        assert dataset_filtered[index].qid == dataset[i].qid
+
+
+def test_num_threads():
+    # Load data set with a single and with multiple parser threads.
+    dataset = get_sample_dataset(normalize=True)
+    dataset_threaded = get_sample_dataset(normalize=True, num_threads=3)
+
+    # Assert both data sets are the same.
+    assert len(dataset) == len(dataset_threaded)
+    for i in range(len(dataset)):
+        sample1 = dataset[i]
+        sample2 = dataset_threaded[i]
+        assert sample1.features.numpy() == approx(sample2.features.numpy())
+        assert sample1.relevance.numpy() == approx(sample2.relevance.numpy())
+        assert sample1.qid == sample2.qid
+
+
+def test_dtype():
+    # Load data set with different feature dtypes.
+    dataset_32 = get_sample_dataset()
+    dataset_64 = get_sample_dataset(dtype=np.float64)
+    dataset_16 = get_sample_dataset(dtype=np.float16)
+
+    # Assert features have the requested dtype and (approximately) the same
+    # values.
+    for i in range(len(dataset_32)):
+        x32 = dataset_32[i].features
+        x64 = dataset_64[i].features
+        x16 = dataset_16[i].features
+        assert x32.dtype == torch.float32
+        assert x64.dtype == torch.float64
+        assert x16.dtype == torch.float16
+        assert x32.numpy() == approx(x64.numpy(), rel=1e-6)
+        assert x16.float().numpy() == approx(x64.numpy(), rel=1e-3)
+
+
+def test_collate_dense_dtype():
+    # Load data set.
+    dataset = get_sample_dataset(dtype=np.float16)
+
+    # Collate a batch and assert the dtype is retained.
+    batch = [dataset[0], dataset[1], dataset[2]]
+    collate_fn = SVMRankDataset.collate_fn(UniformSampler(max_list_size=10))
+    tensor_batch = collate_fn(batch)
+    assert tensor_batch.features.dtype == torch.float16
+
+
+def test_cache():
+    parse_str = "pytorchltr.datasets.svmrank.svmrank.parse_svmrank_file"
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for sparse, normalize in [(False, False), (False, True),
+                                  (True, False)]:
+            expected = get_sample_dataset(sparse=sparse, normalize=normalize)
+            first = get_sample_dataset(sparse=sparse, normalize=normalize,
+                                       cache_dir=tmpdir)
+            with mock.patch(parse_str) as mock_parse:
+                cached = get_sample_dataset(
+                    sparse=sparse, normalize=normalize, cache_dir=tmpdir)
+                assert not mock_parse.called
+            assert len(cached) == len(expected)
+            for dataset in [first, cached]:
+                for i in range(len(expected)):
+                    assert dataset[i].qid == expected[i].qid
+                    assert dataset[i].relevance.equal(expected[i].relevance)
+                    if sparse:
+                        assert dataset[i].features.to_dense().equal(
+                            expected[i].features.to_dense())
+                    else:
+                        assert dataset[i].features.equal(
+                            expected[i].features)
+
+
+def test_zero_based_is_deprecated():
+    with warns(DeprecationWarning):
+        dataset = get_sample_dataset(zero_based=0)
+    assert dataset[0].features.equal(get_sample_dataset()[0].features)
+
+
+def test_cache_keyed_by_checksum():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        get_sample_dataset(cache_dir=tmpdir, sha256="a")
+        get_sample_dataset(cache_dir=tmpdir, sha256="b")
+        get_sample_dataset(cache_dir=tmpdir, sha256="b", dtype=np.float64)
+        assert len(os.listdir(tmpdir)) == 3
+
+
+def test_cache_checks_changed_file():
+    checksum_str = "pytorchltr.datasets.svmrank.svmrank.sha256_checksum"
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "dataset.txt")
+        shutil.copy("tests/datasets/resources/dataset.txt", path)
+        sha256 = sha256_checksum(path)
+        cache_dir = os.path.join(tmpdir, "cache")
+        expected = SVMRankDataset(path, cache_dir=cache_dir, sha256=sha256)
+        assert SVMRankDataset.is_cached(path, cache_dir, sha256)
+
+        # An unchanged file is not read on a cache hit
+        with mock.patch(checksum_str) as mock_checksum:
+            SVMRankDataset(path, cache_dir=cache_dir, sha256=sha256)
+            assert not mock_checksum.called
+
+        # A touched file with the same contents is checked once
+        os.utime(path, (0, 0))
+        assert not SVMRankDataset.is_cached(path, cache_dir, sha256)
+        cached = SVMRankDataset(path, cache_dir=cache_dir, sha256=sha256)
+        assert cached[0].features.equal(expected[0].features)
+        assert SVMRankDataset.is_cached(path, cache_dir, sha256)
+
+        # A file with other contents is parsed instead
+        with open(path, "wb") as f:
+            f.write(b"3 qid:7 1:0.5\n")
+        changed = SVMRankDataset(path, cache_dir=cache_dir, sha256=sha256)
+        assert len(changed) == 1 and changed[0].qid == 7
+
+
+def test_load_from_buffer():
+    expected = get_sample_dataset(normalize=True)
+    with open("tests/datasets/resources/dataset.txt", "rb") as f:
+        contents = f.read()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for cache_dir, sha256 in [(None, None), (tmpdir, "a")]:
+            dataset = SVMRankDataset(contents, normalize=True,
+                                     cache_dir=cache_dir, sha256=sha256)
+            assert len(dataset) == len(expected)
+            for i in range(len(expected)):
+                assert dataset[i].qid == expected[i].qid
+                assert dataset[i].features.equal(expected[i].features)
+                assert dataset[i].relevance.equal(expected[i].relevance)
+
+
+def test_cache_buffer_without_checksum_raises_error():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with raises(ValueError):
+            SVMRankDataset(b"1 qid:1 1:0.5\n", cache_dir=tmpdir)
+
+
+def test_columns():
+    columns = [3, 1, 45]
+    expected = get_sample_dataset(normalize=True)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for cache_dir in [None, tmpdir, tmpdir]:
+            dataset = get_sample_dataset(normalize=True, columns=columns,
+                                         cache_dir=cache_dir)
+            assert len(dataset) == len(expected)
+            for i in range(len(expected)):
+                assert dataset[i].features.equal(
+                    expected[i].features[:, [2, 0, 44]])
+        get_sample_dataset(normalize=True, cache_dir=tmpdir)
+        assert len(os.listdir(tmpdir)) == 2
+
+
+def test_get_comments_and_docids():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for cache_dir in [None, tmpdir, tmpdir]:
+            dataset = get_sample_dataset(comments=True, cache_dir=cache_dir)
+            assert dataset.get_comments(0)[:2] == [
+                "docid = 244338", "docid = 143821"]
+            assert dataset.get_docids(0)[:2] == ["244338", "143821"]
+            for i in range(len(dataset)):
+                assert len(dataset.get_docids(i)) == dataset[i].n
+
+    full = get_sample_dataset(comments=True)
+    dataset = get_sample_dataset(comments=True, filter_queries=True)
+    assert len(dataset) < len(full)
+    for i in range(len(dataset)):
+        assert dataset.get_docids(i) == full.get_docids(
+            full.get_index(dataset[i].qid))
+
+
+def test_get_comments_without_comments_raises_error():
+    dataset = get_sample_dataset()
+    with raises(ValueError):
+        dataset.get_comments(0)
+
+
+def test_progress_fn():
+    progress_fn = mock.MagicMock()
+    get_sample_dataset(progress_fn=progress_fn)
+    assert progress_fn.call_args[0][2]
+    assert progress_fn.call_args[1]["rows"] == 39
+
+
+def test_logging_parse_progress():
+    logging_fn_to_mock = "pytorchltr.utils.progress.logging"
+    with mock.patch(logging_fn_to_mock) as mock_logging:
+        get_sample_dataset(progress_fn=LoggingParseProgress(interval=0.0))
+        msgs = [c[0][0] for c in mock_logging.info.call_args_list]
+        assert msgs[-2].startswith("finished counting [")
+        assert msgs[-1].startswith("finished parsing [")
+        assert "39 rows" in msgs[-1]
+
+
+class _SplitDataset(SVMRankDataset):
+    def __init__(self, split, normalize=False):
+        super().__init__("tests/datasets/resources/dataset.txt",
+                         normalize=normalize,
+                         filter_queries=split != "train")
+
+
+def test_load_splits():
+    datasets = load_splits(_SplitDataset, normalize=True)
+    assert set(datasets.keys()) == {"train", "vali", "test"}
+    for split, dataset in datasets.items():
+        expected = _SplitDataset(split, normalize=True)
+        assert len(dataset) == len(expected)
+        for i in range(len(expected)):
+            assert dataset[i].qid == expected[i].qid
+            assert dataset[i].features.equal(expected[i].features)
+            assert dataset[i].relevance.equal(expected[i].relevance)
+
+
+def test_load_splits_num_workers():
+    datasets = load_splits(_SplitDataset, splits=["train", "test"],
+                           num_workers=1)
+    assert set(datasets.keys()) == {"train", "test"}
+
+
+def test_iterable_same_as_dataset():
+    dataset_file = "tests/datasets/resources/dataset.txt"
+    for filter_queries in [False, True]:
+        dataset = get_sample_dataset(normalize=True,
+                                     filter_queries=filter_queries)
+        iterable = list(SVMRankIterableDataset(
+            dataset_file, normalize=True, filter_queries=filter_queries,
+            chunk_size=100))
+        assert len(dataset) == len(iterable)
+        for i in range(len(dataset)):
+            assert dataset[i].qid == iterable[i].qid
+            assert dataset[i].n == iterable[i].n
+            assert dataset[i].features.numpy() == approx(
+                iterable[i].features.numpy())
+            assert dataset[i].relevance.equal(iterable[i].relevance)
+
+
+def test_iterable_data_loader():
+    dataset_file = "tests/datasets/resources/dataset.txt"
+    iterable = SVMRankIterableDataset(dataset_file)
+    loader = torch.utils.data.DataLoader(
+        iterable, batch_size=3,
+        collate_fn=SVMRankDataset.collate_fn(UniformSampler(max_list_size=10)))
+    batches = list(loader)
+    assert len(batches) == 2
+    assert batches[0].features.shape == (3, 10, 45)
+    assert batches[1].features.shape == (1, 10, 45)
+    assert batches[0].qid.tolist() == [1, 16, 60]
+    assert batches[1].qid.tolist() == [63]
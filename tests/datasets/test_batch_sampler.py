@@ -0,0 +1,162 @@
+import numpy as np
+import torch
+from pytest import raises
+
+from pytorchltr.datasets.batch_sampler import BucketBatchSampler
+from pytorchltr.datasets.batch_sampler import BudgetBatchSampler
+from pytorchltr.datasets.batch_sampler import padding_ratio
+from pytorchltr.datasets.svmrank.svmrank import SVMRankDataset
+
+
+def rng(seed=1608637542):
+    gen = torch.Generator()
+    gen.manual_seed(seed)
+    return gen
+
+
+def skewed_lengths(n=1000, seed=4200):
+    return np.random.RandomState(seed).geometric(0.01, size=n)
+
+
+def test_padding_ratio():
+    lengths = [1, 3, 2, 2]
+    assert padding_ratio(lengths, [[0, 1], [2, 3]]) == 1.0 - 8.0 / 10.0
+    assert padding_ratio(lengths, [[2, 3]]) == 0.0
+    assert padding_ratio(lengths, []) == 0.0
+
+
+def test_bucket_batch_sampler_covers_all_items():
+    lengths = skewed_lengths()
+    sampler = BucketBatchSampler(lengths, 32, bucket_size=4, generator=rng())
+    batches = list(sampler)
+    assert len(batches) == len(sampler) == 32
+    assert sorted(map(len, batches)) == [1000 % 32] + [32] * 31
+    assert sorted(i for batch in batches for i in batch) == \
+        list(range(1000))
+
+
+def test_bucket_batch_sampler_reduces_padding():
+    lengths = skewed_lengths()
+    sampler = BucketBatchSampler(lengths, 16, generator=rng())
+    batches = list(sampler)
+    perm = torch.randperm(len(lengths), generator=rng()).tolist()
+    random_batches = [perm[i:i + 16] for i in range(0, len(perm), 16)]
+    assert sampler.padding_ratio == padding_ratio(lengths, batches)
+    assert sampler.padding_ratio < padding_ratio(lengths, random_batches) / 5
+
+
+def test_bucket_batch_sampler_shuffles():
+    lengths = skewed_lengths()
+    sampler = BucketBatchSampler(lengths, 16, bucket_size=8, generator=rng())
+    first = list(sampler)
+    second = list(sampler)
+    assert first != second
+    assert sorted(map(sorted, first)) != sorted(map(sorted, second))
+
+    again = list(BucketBatchSampler(lengths, 16, bucket_size=8,
+                                    generator=rng()))
+    assert again == first
+
+
+def test_bucket_batch_sampler_no_shuffle():
+    lengths = [5, 1, 4, 2, 3, 6]
+    sampler = BucketBatchSampler(lengths, 2, bucket_size=2, shuffle=False)
+    assert list(sampler) == [[1, 3], [2, 0], [4, 5]]
+
+
+def test_bucket_batch_sampler_drop_last():
+    lengths = skewed_lengths(n=100)
+    sampler = BucketBatchSampler(lengths, 16, bucket_size=2, drop_last=True,
+                                 generator=rng())
+    batches = list(sampler)
+    assert len(batches) == len(sampler) == 6
+    assert all(len(batch) == 16 for batch in batches)
+
+
+def test_bucket_batch_sampler_invalid_arguments():
+    with raises(ValueError):
+        BucketBatchSampler([1, 2], 0)
+    with raises(ValueError):
+        BucketBatchSampler([1, 2], 1, bucket_size=0)
+
+
+def test_bucket_batch_sampler_data_loader():
+    dataset = SVMRankDataset("tests/datasets/resources/dataset.txt",
+                             filter_queries=True)
+    lengths = dataset.get_lengths()
+    assert list(lengths) == [dataset[i].n for i in range(len(dataset))]
+    sampler = BucketBatchSampler(lengths, 2, generator=rng())
+    loader = torch.utils.data.DataLoader(
+        dataset, batch_sampler=sampler, collate_fn=dataset.collate_fn())
+    qids = [int(qid) for batch in loader for qid in batch.qid]
+    assert sorted(qids) == sorted(dataset[i].qid for i in range(len(dataset)))
+
+
+def _padded_costs(lengths, batch):
+    list_size = max(lengths[i] for i in batch)
+    return len(batch) * list_size, len(batch) * list_size * list_size
+
+
+def test_budget_batch_sampler_respects_documents():
+    lengths = skewed_lengths()
+    sampler = BudgetBatchSampler(lengths, max_documents=1000,
+                                 generator=rng())
+    batches = list(sampler)
+    assert sorted(i for batch in batches for i in batch) == \
+        list(range(1000))
+    for batch in batches:
+        documents, _ = _padded_costs(lengths, batch)
+        assert documents <= 1000 or len(batch) == 1
+    assert sampler.padding_ratio == padding_ratio(lengths, batches)
+    assert sampler.padding_ratio < 0.05
+
+
+def test_budget_batch_sampler_respects_pairs():
+    lengths = skewed_lengths()
+    sampler = BudgetBatchSampler(lengths, max_documents=2000,
+                                 max_pairs=40000, generator=rng())
+    batches = list(sampler)
+    assert sorted(i for batch in batches for i in batch) == \
+        list(range(1000))
+    for batch in batches:
+        documents, pairs = _padded_costs(lengths, batch)
+        assert (documents <= 2000 and pairs <= 40000) or len(batch) == 1
+    assert any(len(batch) == 1 and lengths[batch[0]] > 200
+               for batch in batches)
+
+
+def test_budget_batch_sampler_len_matches_next_epoch():
+    lengths = skewed_lengths()
+    sampler = BudgetBatchSampler(lengths, max_pairs=50000, bucket_size=64,
+                                 generator=rng())
+    for _ in range(3):
+        n = len(sampler)
+        assert len(sampler) == n
+        assert len(list(sampler)) == n
+
+
+def test_budget_batch_sampler_no_shuffle():
+    lengths = [5, 1, 4, 2, 3, 6]
+    sampler = BudgetBatchSampler(lengths, max_documents=8, bucket_size=3,
+                                 shuffle=False)
+    assert list(sampler) == [[1, 2], [0], [3, 4], [5]]
+    sampler = BudgetBatchSampler(lengths, max_documents=8, bucket_size=None,
+                                 shuffle=False)
+    assert list(sampler) == [[0], [1, 2], [3, 4], [5]]
+
+
+def test_budget_batch_sampler_shuffles():
+    lengths = skewed_lengths()
+    sampler = BudgetBatchSampler(lengths, max_documents=500, generator=rng())
+    first = list(sampler)
+    assert first != list(sampler)
+    again = list(BudgetBatchSampler(lengths, max_documents=500,
+                                    generator=rng()))
+    assert again == first
+
+
+def test_budget_batch_sampler_invalid_arguments():
+    with raises(ValueError):
+        BudgetBatchSampler([1, 2])
+    with raises(ValueError):
+        BudgetBatchSampler([1, 2], max_documents=10, bucket_size=0)
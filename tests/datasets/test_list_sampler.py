@@ -4,6 +4,7 @@ from pytorchltr.datasets.list_sampler import UniformSampler
 from pytorchltr.datasets.list_sampler import BalancedRelevanceSampler
 
 from pytest import approx
+from pytest import raises
 
 
 def rng(seed=1608637542):
@@ -28,6 +29,27 @@ def test_list_sampler_unlimited():
     assert idxs.equal(expected)
 
 
+def test_list_sampler_max_list_sizes():
+    n = torch.tensor([1, 5, 8, 0], dtype=torch.long)
+    assert ListSampler(max_list_size=5).max_list_sizes(n).equal(
+        torch.tensor([1, 5, 5, 0]))
+    assert ListSampler().max_list_sizes(n).equal(n)
+
+
+class _RelevantListSampler(ListSampler):
+    def max_list_size(self, relevance):
+        return max(int((relevance > 0).sum()), 1)
+
+
+def test_list_sampler_max_list_sizes_overridden():
+    sampler = _RelevantListSampler()
+    relevance = [torch.tensor([0, 1, 2]), torch.tensor([0, 0])]
+    n = torch.tensor([3, 2], dtype=torch.long)
+    assert sampler.max_list_sizes(n, relevance).equal(torch.tensor([2, 1]))
+    with raises(ValueError):
+        sampler.max_list_sizes(n)
+
+
 def test_list_sampler_single():
     sampler = ListSampler(max_list_size=1)
     relevance = torch.tensor([0], dtype=torch.long)
@@ -73,3 +73,28 @@ def test_pytrec_eval_input_qids():
     }
     assert qrels_expected == qrels
     assert run_expected == run
+
+
+def test_docids():
+    scores = torch.FloatTensor([
+        [10.0, 5.0, 2.0],
+        [5.0, 6.0, 4.0]
+    ])
+    ys = torch.LongTensor([
+        [0, 1, 1],
+        [3, 1, 0]
+    ])
+    n = torch.LongTensor([3, 2])
+    docids = [["doc-a", "doc-b", "doc-c"], ["doc-d", "doc-e"]]
+
+    qrels, run = generate_pytrec_eval(scores, ys, n, docids=docids)
+    qrels_expected = {
+        'q0': {'doc-a': 0, 'doc-b': 1, 'doc-c': 1},
+        'q1': {'doc-d': 3, 'doc-e': 1}
+    }
+    run_expected = {
+        'q0': {'doc-a': 10.0, 'doc-b': 5.0, 'doc-c': 2.0},
+        'q1': {'doc-d': 5.0, 'doc-e': 6.0}
+    }
+    assert qrels_expected == qrels
+    assert run_expected == run
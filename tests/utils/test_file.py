@@ -1,9 +1,12 @@
 import os
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from unittest import mock
 from pathlib import Path
 
 import pytest
+from pytorchltr.utils.file import expected_sha256
 from pytorchltr.utils.file import validate_expected_files
 from pytorchltr.utils.file import validate_and_download
 from pytorchltr.utils.file import ChecksumError
@@ -127,6 +130,27 @@ def test_validate_and_download_calls_download():
         downloader.download.assert_called_once_with(tmpdir)
 
 
+def test_validate_and_download_concurrently_downloads_once():
+    downloader = mock.MagicMock()
+    expected_files = ["file1.txt"]
+
+    def create_files_side_effect(location):
+        time.sleep(0.05)
+        Path(os.path.join(location, "file1.txt")).touch()
+
+    downloader.download.side_effect = create_files_side_effect
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Validate from several threads at once, only the first should
+        # trigger a download.
+        with ThreadPoolExecutor(4) as executor:
+            for _ in range(4):
+                executor.submit(
+                    validate_and_download, tmpdir, expected_files,
+                    downloader=downloader, validate_checksums=False)
+        downloader.download.assert_called_once_with(tmpdir)
+
+
 def test_validate_and_download_skips_download():
     downloader = mock.MagicMock()
     expected_files = ["file1.txt"]
@@ -191,3 +215,16 @@ def test_validate_and_download_succeeds_without_downloader():
         validate_and_download(
             tmpdir, expected_files, downloader=None,
             validate_checksums=False)
+
+
+def test_expected_sha256():
+    expected_files = [
+        "file1.txt",
+        {"path": "dir/file2.txt", "sha256": "abc"},
+        {"path": os.path.join("dir", "file3.txt"), "sha256": "def"}
+    ]
+    assert expected_sha256(expected_files, "file1.txt") is None
+    assert expected_sha256(expected_files, "file4.txt") is None
+    assert expected_sha256(expected_files,
+                           os.path.join("dir", "file2.txt")) == "abc"
+    assert expected_sha256(expected_files, "dir/file3.txt") == "def"